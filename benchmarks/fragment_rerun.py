@@ -0,0 +1,58 @@
+"""Per-click render cost: full-script rerun vs. the Macro Logger fragment.
+
+Clicks "+10g" repeatedly in a headless AppTest session and reads the timing
+records written by fitcoach.timing:
+
+* full script  - a complete Today's Plan run, i.e. what every click cost
+                 before the logger became a fragment (it also used to pay an
+                 extra, cut-short run for the st.rerun() call);
+* fragment     - the sections a fragment-only rerun executes
+                 (today.macro_logger + sidebar.targets).
+
+AppTest always executes the whole script, so the fragment number is the
+measured cost of the fragment body inside those runs, not a websocket
+round trip.
+
+    python benchmarks/fragment_rerun.py --clicks 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from fitcoach import timing  # noqa: E402
+
+FRAGMENT_SECTIONS = ('today.macro_logger', 'sidebar.targets')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--clicks", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["COACH_STORAGE_URL"] = f"sqlite:///{tmp}/bench.sqlite"
+        at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=60)
+        at.run()
+        full, fragment = [], []
+        for _ in range(args.clicks):
+            next(b for b in at.button if b.label == "+10g").click().run()
+            record = timing.session_runs(at.session_state)[-1]
+            full.append(record['total_ms'])
+            fragment.append(sum(record['sections_ms'].get(name, 0.0) for name in FRAGMENT_SECTIONS))
+
+    full_ms, fragment_ms = statistics.median(full), statistics.median(fragment)
+    print(f"clicks:                 {args.clicks}")
+    print(f"full script rerun:      {full_ms:8.2f} ms (median)")
+    print(f"macro logger fragment:  {fragment_ms:8.2f} ms (median)")
+    print(f"per-click reduction:    {full_ms / fragment_ms if fragment_ms else float('inf'):8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Offline load test: N concurrent headless sessions against the app.
+
+Each virtual user is its own AppTest session (own `?user=` id, shared process,
+storage and worker pool, like a real server) and loops over three scenarios:
+
+* coach    - open AI Coach, send a prompt, poll until the reply is finished;
+* progress - open Progress and switch the history range;
+* library  - open the Exercise Library, search and filter.
+
+Gemini is replaced by the local stand-in in fitcoach/fake_genai.py, so no
+network or API key is needed. Prompts are unique per message so the reply
+cache does not hide model latency.
+
+AppTest swaps a process-global runtime in and out around every run, so script
+runs are serialized through one lock; model calls still overlap on the shared
+worker pool. Like a real single-process server, script time is bound by the
+GIL either way, and waiting for the lock shows up as contention in the numbers.
+
+    python benchmarks/loadtest.py --users 8 --iterations 5 --latency 0.5 --error-rate 0.02
+    python benchmarks/loadtest.py --json --max-p95-ms 3000   # CI: non-zero exit on regression
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from fitcoach.timing import percentile  # noqa: E402
+
+SCENARIOS = ('coach', 'progress', 'library')
+PROMPTS = (
+    "How much protein should I eat today?",
+    "My knee hurts when I squat, why?",
+    "What should I eat for dinner?",
+    "Is my deadlift form ok if my back rounds a little?",
+    "How much water after training?",
+)
+SEARCHES = ("squat", "push", "core", "sqaut", "lunge", "")
+
+_script_lock = threading.Lock()
+
+
+class VirtualUser:
+
+    def __init__(self, index, args, samples, lock):
+        self.index = index
+        self.args = args
+        self.samples = samples
+        self.lock = lock
+        self.random = random.Random(index)
+        self.messages_sent = 0
+
+    def record(self, scenario, started, ok):
+        with self.lock:
+            self.samples.append((scenario, (time.perf_counter() - started) * 1000, ok))
+
+    def rerun(self, target):
+        """`target.run()` (an AppTest or a widget) under the script lock."""
+        with _script_lock:
+            target.run()
+
+    def navigate(self, at, page):
+        self.rerun(at.sidebar.radio[0].set_value(page))
+        return not at.exception
+
+    def coach(self, at):
+        started = time.perf_counter()
+        ok = self.navigate(at, "AI Coach")
+        if ok:
+            self.messages_sent += 1
+            prompt = f"{self.random.choice(PROMPTS)} (user {self.index}, message {self.messages_sent})"
+            self.rerun(at.chat_input[0].set_value(prompt))
+            deadline = started + self.args.timeout
+            while 'pending_reply' in at.session_state and time.perf_counter() < deadline and not at.exception:
+                time.sleep(self.args.poll_interval)
+                self.rerun(at)
+            last = at.session_state.messages[-1]['content'] if 'messages' in at.session_state else ""
+            ok = not at.exception and 'pending_reply' not in at.session_state and not any(marker in last for marker in ("Error:", "try again"))
+        self.record('coach', started, ok)
+
+    def progress(self, at):
+        started = time.perf_counter()
+        ok = self.navigate(at, "Progress")
+        if ok:
+            self.rerun(at.selectbox[0].set_value(self.random.choice(["Last 30 days", "Last year", "All time"])))
+            ok = not at.exception
+        self.record('progress', started, ok)
+
+    def library(self, at):
+        started = time.perf_counter()
+        ok = self.navigate(at, "Exercise Library")
+        if ok:
+            self.rerun(at.text_input[0].set_value(self.random.choice(SEARCHES)))
+            self.rerun(at.selectbox[0].set_value(self.random.choice(["All", "Home", "Gym"])))
+            ok = not at.exception
+        self.record('library', started, ok)
+
+    def run(self):
+        at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=self.args.timeout)
+        at.query_params["user"] = f"load-{self.index}"
+        started = time.perf_counter()
+        self.rerun(at)
+        self.record('open', started, not at.exception)
+        for _ in range(self.args.iterations):
+            for scenario in self.args.scenarios:
+                getattr(self, scenario)(at)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--iterations", type=int, default=3, help="scenario loops per session")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--latency", type=float, default=0.5, help="fake model time to first token (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake calls that fail")
+    parser.add_argument("--workers", type=int, default=8, help="COACH_WORKERS")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-interaction timeout (s)")
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if any scenario's p95 exceeds this")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "COACH_FAKE_GEMINI": f"latency={args.latency},tokens_per_second={args.tokens_per_second},"
+                                 f"error_rate={args.error_rate},seed=0",
+            "COACH_STORAGE_URL": f"sqlite:///{tmp}/load.sqlite",
+            "COACH_CACHE_PATH": os.path.join(tmp, "cache.sqlite"),
+            "COACH_WORKERS": str(args.workers),
+            # One fake key is shared by every session; measure the app, not the quota.
+            "COACH_RATE_LIMITS": os.environ.get("COACH_RATE_LIMITS", json.dumps({
+                "gemini-3-pro-preview": [6000, 1000], "gemini-2.5-flash-lite-latest": [6000, 1000],
+            })),
+        })
+        os.environ.pop("API_KEY", None)
+
+        samples, lock = [], threading.Lock()
+        users = [VirtualUser(i, args, samples, lock) for i in range(args.users)]
+        threads = [threading.Thread(target=user.run, name=f"user-{user.index}") for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    by_scenario = collections.defaultdict(list)
+    errors = collections.Counter()
+    for scenario, ms, ok in samples:
+        by_scenario[scenario].append(ms)
+        errors[scenario] += not ok
+    report = {'users': args.users, 'elapsed_s': round(elapsed, 2),
+              'throughput_per_s': round(len(samples) / elapsed, 2), 'scenarios': {}}
+    for scenario, values in by_scenario.items():
+        ordered = sorted(values)
+        report['scenarios'][scenario] = {
+            'count': len(ordered),
+            'errors': errors[scenario],
+            'p50_ms': round(statistics.median(ordered), 1),
+            'p95_ms': round(percentile(ordered, 0.95), 1),
+            'p99_ms': round(percentile(ordered, 0.99), 1),
+            'throughput_per_s': round(len(ordered) / elapsed, 2),
+        }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{args.users} sessions, {len(samples)} interactions in {elapsed:.1f}s "
+              f"({report['throughput_per_s']}/s)")
+        print(f"{'scenario':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>8}")
+        for scenario, row in report['scenarios'].items():
+            print(f"{scenario:<10}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}"
+                  f"{row['p95_ms']:>10}{row['p99_ms']:>10}{row['throughput_per_s']:>8}")
+
+    if args.max_p95_ms is not None and any(row['p95_ms'] > args.max_p95_ms for row in report['scenarios'].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
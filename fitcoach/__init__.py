@@ -0,0 +1 @@
+"""Support code for the Streamlit coach app (streamlit_app.py)."""
@@ -0,0 +1,173 @@
+"""Columnar history and vectorized aggregates for the Progress page.
+
+`HistoryColumns` keeps history as NumPy arrays that grow in place, so saving a
+new entry appends one row instead of rebuilding a DataFrame. The aggregate
+helpers work on a calendar-day grid (missing days are NaN) and are fully
+vectorized.
+"""
+import numpy as np
+
+STREAK_THRESHOLD = 0.5
+
+
+class HistoryColumns:
+    """Append-only, date-sorted history stored column-wise."""
+
+    def __init__(self, rows=(), capacity=64):
+        rows = list(rows)
+        capacity = max(capacity, len(rows))
+        self._dates = np.empty(capacity, dtype='datetime64[D]')
+        self._weight = np.empty(capacity, dtype=float)
+        self._tasks = np.empty(capacity, dtype=float)
+        self._n = 0
+        if rows:
+            self._n = len(rows)
+            self._dates[:self._n] = [r['date'] for r in rows]
+            self._weight[:self._n] = [np.nan if r.get('weight') is None else r['weight'] for r in rows]
+            self._tasks[:self._n] = [np.nan if r.get('tasks') is None else r['tasks'] for r in rows]
+            order = np.argsort(self._dates[:self._n], kind='stable')
+            for col in (self._dates, self._weight, self._tasks):
+                col[:self._n] = col[:self._n][order]
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def dates(self):
+        return self._dates[:self._n]
+
+    @property
+    def weight(self):
+        return self._weight[:self._n]
+
+    @property
+    def tasks(self):
+        return self._tasks[:self._n]
+
+    def append(self, row):
+        """Adds a row; a row for an existing date replaces it."""
+        date = np.datetime64(row['date'], 'D')
+        weight = np.nan if row.get('weight') is None else row['weight']
+        tasks = np.nan if row.get('tasks') is None else row['tasks']
+        pos = int(np.searchsorted(self.dates, date))
+        if pos < self._n and self._dates[pos] == date:
+            self._weight[pos], self._tasks[pos] = weight, tasks
+            return
+        if self._n == len(self._dates):
+            self._grow()
+        if pos < self._n:
+            # Back-dated entry: shift the tail (rare; normal saves land at the end).
+            for col in (self._dates, self._weight, self._tasks):
+                col[pos + 1:self._n + 1] = col[pos:self._n]
+        self._dates[pos], self._weight[pos], self._tasks[pos] = date, weight, tasks
+        self._n += 1
+
+    def _grow(self):
+        size = len(self._dates) * 2
+        self._dates = np.resize(self._dates, size)
+        self._weight = np.resize(self._weight, size)
+        self._tasks = np.resize(self._tasks, size)
+
+    def calendar(self, values):
+        """Spreads `values` over every day from the first to the last entry."""
+        if not self._n:
+            return np.array([], dtype='datetime64[D]'), np.array([], dtype=float)
+        first = self.dates[0]
+        days = np.arange(first, self.dates[-1] + 1)
+        grid = np.full(len(days), np.nan)
+        grid[(self.dates - first).astype(int)] = values
+        return days, grid
+
+
+def rolling_mean(grid, window):
+    """Trailing mean over `window` calendar days, skipping missing days."""
+    present = ~np.isnan(grid)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(present, grid, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(present)))
+    lo = np.maximum(np.arange(1, len(grid) + 1) - window, 0)
+    n = counts[1:] - counts[lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (sums[1:] - sums[lo]) / n, np.nan)
+
+
+def weekday(days):
+    """Monday=0 .. Sunday=6 for a datetime64[D] array."""
+    return (days.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+
+def completion_rate(history, planned_by_weekday):
+    """Per-entry task completion rate in [0, 1].
+
+    `planned_by_weekday` is a length-7 sequence (Monday first) with the number
+    of planned tasks for each weekday.
+    """
+    planned = np.asarray(planned_by_weekday, dtype=float)[weekday(history.dates)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(planned > 0, history.tasks / planned, np.nan)
+    return np.clip(rate, 0.0, 1.0)
+
+
+def period_start(days, period):
+    """Monday of the ISO week (period='week') or first of the month ('month')."""
+    days = days.astype('datetime64[D]')
+    if period == 'week':
+        return days - weekday(days).astype('timedelta64[D]')
+    if period == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    raise ValueError(f"Unknown period: {period}")
+
+
+def period_means(days, columns, period):
+    """Per-period means of aligned columns, ignoring NaNs.
+
+    Returns (period_starts, rows_per_period, {name: means}).
+    """
+    starts, inverse, counts = np.unique(period_start(days, period), return_inverse=True, return_counts=True)
+    means = {}
+    for name, col in columns.items():
+        valid = ~np.isnan(col)
+        sums = np.bincount(inverse, weights=np.where(valid, col, 0.0), minlength=len(starts))
+        n = np.bincount(inverse, weights=valid, minlength=len(starts))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[name] = np.where(n > 0, sums / n, np.nan)
+    return starts, counts, means
+
+
+def streaks(history, planned_by_weekday, threshold=STREAK_THRESHOLD, today=None):
+    """(current, longest) run of consecutive calendar days at or above `threshold`.
+
+    The current run must reach yesterday or `today` (the user's local date);
+    a run that ended earlier is broken. Without `today` it counts up to the
+    last entry.
+    """
+    if not len(history):
+        return 0, 0
+    _, grid = history.calendar(completion_rate(history, planned_by_weekday))
+    hit = np.concatenate(([False], grid >= threshold, [False]))
+    edges = np.flatnonzero(np.diff(hit.astype(np.int8)))
+    runs = edges[1::2] - edges[::2]
+    longest = int(runs.max()) if len(runs) else 0
+    current = int(runs[-1]) if len(runs) and edges[-1] == len(grid) else 0
+    if today is not None and history.dates[-1] < np.datetime64(today, 'D') - 1:
+        current = 0
+    return current, longest
+
+
+def downsample(days, columns, max_points=180):
+    """Bucket-averages aligned columns so at most `max_points` points are drawn.
+
+    Returns (bucket_start_days, [averaged columns]). NaNs are ignored inside a
+    bucket.
+    """
+    n = len(days)
+    if n <= max_points:
+        return days, list(columns)
+    starts = np.linspace(0, n, max_points, endpoint=False).astype(int)
+    out = []
+    for col in columns:
+        valid = ~np.isnan(col)
+        sums = np.add.reduceat(np.where(valid, col, 0.0), starts)
+        counts = np.add.reduceat(valid.astype(float), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out.append(np.where(counts > 0, sums / counts, np.nan))
+    return days[starts], out
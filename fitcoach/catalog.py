@@ -0,0 +1,106 @@
+"""The exercise catalog, loaded once per process and shared by all sessions.
+
+data/exercises.json is the canonical catalog (ported from
+data/exerciseDatabase.ts, plus the Python-only exercises the plan rules use).
+Entries become read-only `Exercise` records with `__slots__`; list fields are
+tuples. `Catalog.version` is a hash of the file, for caches keyed on catalog
+content.
+"""
+import collections.abc
+import functools
+import hashlib
+import json
+import os
+
+from fitcoach.constants import DATA_DIR
+
+CATALOG_PATH = os.path.join(DATA_DIR, 'exercises.json')
+
+# Exercise attribute -> JSON key.
+_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'group': 'group',
+    'mode': 'mode',
+    'muscle_group': 'muscleGroup',
+    'pattern': 'movementPattern',
+    'level': 'level',
+    'prescription': 'defaultPrescription',
+    'form_steps': 'formSteps',
+    'common_mistakes': 'commonMistakes',
+    'safety_notes': 'safetyNotes',
+    'video_links': 'videoLinks',
+    'alternatives': 'alternatives',
+    'visual_svg': 'visualSvg',
+}
+_DEFAULTS = {'group': 'General', 'pattern': 'Other', 'level': 'Intermediate', 'prescription': '', 'visual_svg': None}
+
+
+class Exercise:
+    """One catalog entry. Immutable; compare and hash by id."""
+
+    __slots__ = tuple(_FIELDS)
+
+    def __init__(self, **fields):
+        for name in _FIELDS:
+            value = fields.get(name, _DEFAULTS.get(name, ()))
+            object.__setattr__(self, name, tuple(value) if isinstance(value, list) else value)
+
+    @classmethod
+    def from_json(cls, record):
+        fields = {name: record[key] for name, key in _FIELDS.items() if key in record}
+        fields['video_links'] = [(link['title'], link['url']) for link in record.get('videoLinks', ())]
+        return cls(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Exercise records are read-only")
+
+    def __eq__(self, other):
+        return isinstance(other, Exercise) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"Exercise({self.id!r})"
+
+    @property
+    def video(self):
+        """URL of the first video link, or ''. `video_links` holds (title, url) pairs."""
+        return self.video_links[0][1] if self.video_links else ""
+
+
+class Catalog(collections.abc.Mapping):
+    """Read-only id -> Exercise mapping in file order."""
+
+    __slots__ = ('_by_id', 'version')
+
+    def __init__(self, exercises, version=""):
+        self._by_id = {ex.id: ex for ex in exercises}
+        self.version = version
+
+    def __getitem__(self, ex_id):
+        return self._by_id[ex_id]
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def details(self, ex_id):
+        """The exercise, or a shared placeholder for ids missing from the catalog."""
+        return self._by_id.get(ex_id) or placeholder(ex_id)
+
+
+@functools.lru_cache(maxsize=256)
+def placeholder(ex_id):
+    return Exercise(id=ex_id, name=ex_id.replace('-', ' ').title(), prescription='Check description')
+
+
+@functools.lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    records = json.loads(raw)['exercises']
+    return Catalog((Exercise.from_json(r) for r in records), version=hashlib.sha1(raw).hexdigest()[:12])
@@ -0,0 +1,320 @@
+"""Bounded background worker pool for AI Coach requests.
+
+Model calls run on a fixed-size thread pool instead of the Streamlit script
+thread. Each user has a FIFO queue so only one of their requests is in flight
+at a time; other users' requests proceed in parallel up to `max_workers`.
+Jobs stream their output into `CoachJob.chunks`, which the UI polls.
+
+Transient upstream errors (rate limits, 5xx, timeouts, dropped connections)
+are retried with exponential backoff as long as no output has been produced
+yet. The stream is read on a helper thread, so the deadline and
+cancellation take effect even while a call hangs before its first chunk: the
+worker gives up at once and the helper stops at the next chunk (the HTTP
+client's own timeout bounds a call that never answers). Pollers also call
+`CoachJob.check_deadline()`, which marks an overdue job TIMEOUT.
+
+With a `RateLimiter`, every attempt first reserves a token for its
+(API key, model); the job shows as THROTTLED while it waits and ends as
+REJECTED (with `retry_after`) when the wait would be too long or the API keeps
+answering 429. Jobs submitted with the same `coalesce_key` while one is in
+flight share that job instead of making a second upstream call.
+"""
+import collections
+import itertools
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fitcoach.timing import percentile
+
+QUEUED, THROTTLED, RUNNING = 'queued', 'throttled', 'running'
+DONE, ERROR, CANCELLED, TIMEOUT, REJECTED = 'done', 'error', 'cancelled', 'timeout', 'rejected'
+FINISHED = (DONE, ERROR, CANCELLED, TIMEOUT, REJECTED)
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+_TRANSIENT_NAMES = ('Timeout', 'ConnectError', 'ConnectionError', 'RemoteProtocolError', 'ReadError')
+POLL_INTERVAL = 0.1
+
+
+def is_transient(exc):
+    """True for errors worth retrying: HTTP 408/429/5xx and network failures."""
+    code = getattr(exc, 'code', None) or getattr(exc, 'status_code', None)
+    if code in TRANSIENT_STATUS_CODES:
+        return True
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return any(name in type(exc).__name__ for name in _TRANSIENT_NAMES)
+
+
+class CoachJob:
+    """One coach request. `run()` must return an iterable of text chunks."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, user_id, run, timeout, coalesce_key=None, limit_key=None):
+        self.id = next(self._ids)
+        self.user_id = user_id
+        self.run = run
+        self.timeout = timeout
+        self.coalesce_key = coalesce_key
+        self.limit_key = limit_key
+        self.subscribers = {user_id}
+        self.status = QUEUED
+        self.chunks = []
+        self.error = None
+        self.retry_after = None
+        self.attempts = 0
+        self.throttled = 0.0
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+        self.first_chunk_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def text(self):
+        return "".join(self.chunks)
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def advance(self, status):
+        """Moves an unfinished job to a non-final status (RUNNING, THROTTLED). False if it already ended."""
+        with self._lock:
+            if not self.finished:
+                self.status = status
+            return not self.finished
+
+    def finish(self, status):
+        """Sets a final status unless the job already has one. Returns the job's status."""
+        with self._lock:
+            if not self.finished:
+                self.status = status
+                self.finished_at = time.perf_counter()
+            return self.status
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self.status == QUEUED:
+            self.finish(CANCELLED)
+
+    def check_deadline(self):
+        """Marks the job TIMEOUT once it has run longer than `timeout`. Returns `finished`.
+
+        For pollers: the job ends on time even if its worker thread is stuck.
+        """
+        if not self.finished and self.started_at is not None and time.perf_counter() - self.started_at > self.timeout:
+            self.finish(TIMEOUT)
+            self.cancel_event.set()
+        return self.finished
+
+    def stats(self):
+        """Latency breakdown in seconds (queue wait, rate-limit wait, time to first token, total)."""
+        end = self.finished_at or time.perf_counter()
+        started = self.started_at or end
+        first = self.first_chunk_at or end
+        return {
+            'wait': started - self.submitted_at,
+            'throttled': self.throttled,
+            'ttft': first - self.submitted_at,
+            'total': end - self.submitted_at,
+            'attempts': self.attempts,
+        }
+
+
+class CoachWorkerPool:
+
+    def __init__(self, max_workers=8, timeout=120.0, max_retries=3, backoff=1.0, limiter=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.limiter = limiter
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="coach-worker")
+        self._lock = threading.Lock()
+        self._user_queues = collections.defaultdict(collections.deque)
+        self._active_users = set()
+        self._waits_ms = collections.deque(maxlen=500)
+        self._counters = collections.Counter()
+
+    def submit(self, user_id, run, timeout=None, coalesce_key=None, limit_key=None):
+        """Queues `run` for `user_id`; returns the job to poll.
+
+        If a job with the same `coalesce_key` is still in flight, the caller is
+        subscribed to it and that job is returned instead (its `user_id` is
+        then someone else's).
+        """
+        with self._lock:
+            self._counters['submitted'] += 1
+            shared = self._inflight.get(coalesce_key) if coalesce_key else None
+            if shared is not None and not shared.finished and not shared.cancel_event.is_set():
+                shared.subscribers.add(user_id)
+                self._counters['coalesced'] += 1
+                return shared
+            job = CoachJob(user_id, run, timeout or self.timeout, coalesce_key, limit_key)
+            if coalesce_key:
+                self._inflight[coalesce_key] = job
+            self._user_queues[user_id].append(job)
+            self._dispatch(user_id)
+        return job
+
+    def cancel_user(self, user_id):
+        """Cancels `user_id`'s jobs. Jobs shared with other users keep running for them."""
+        with self._lock:
+            jobs = [job for q in self._user_queues.values() for job in q if user_id in job.subscribers]
+            for job in jobs:
+                job.subscribers.discard(user_id)
+            jobs = [job for job in jobs if not job.subscribers]
+        for job in jobs:
+            job.cancel()
+
+    def _dispatch(self, user_id):
+        # Caller holds the lock. Start the user's next job unless one is running.
+        if user_id in self._active_users:
+            return
+        queue = self._user_queues[user_id]
+        while queue and queue[0].status == CANCELLED:
+            queue.popleft()
+            self._counters[CANCELLED] += 1
+        if not queue:
+            self._user_queues.pop(user_id, None)
+            return
+        self._active_users.add(user_id)
+        self._executor.submit(self._work, queue[0])
+
+    def _work(self, job):
+        try:
+            if not job.cancel_event.is_set():
+                self._execute(job)
+            job.finish(CANCELLED)
+        except BaseException:
+            job.finish(ERROR)
+            raise
+        finally:
+            with self._lock:
+                self._counters[job.status] += 1
+                if job.coalesce_key and self._inflight.get(job.coalesce_key) is job:
+                    del self._inflight[job.coalesce_key]
+                queue = self._user_queues.get(job.user_id)
+                if queue and queue[0] is job:
+                    queue.popleft()
+                self._active_users.discard(job.user_id)
+                self._dispatch(job.user_id)
+
+    def _execute(self, job):
+        job.started_at = time.perf_counter()
+        job.advance(RUNNING)
+        with self._lock:
+            self._waits_ms.append((job.started_at - job.submitted_at) * 1000)
+        deadline = job.started_at + job.timeout
+        while True:
+            if not self._wait_for_rate_limit(job, deadline):
+                return
+            if not job.advance(RUNNING):
+                return
+            job.attempts += 1
+            try:
+                job.finish(self._stream(job, deadline))
+                return
+            except Exception as e:
+                retry = job.attempts <= self.max_retries and not job.chunks and is_transient(e)
+                delay = self.backoff * 2 ** (job.attempts - 1) * random.uniform(0.5, 1.0)
+                if not retry or time.perf_counter() + delay > deadline:
+                    job.error = e
+                    if getattr(e, 'code', None) == 429 or getattr(e, 'status_code', None) == 429:
+                        # Upstream quota: report it as throttling, not as a failure.
+                        job.retry_after = delay
+                        job.finish(REJECTED)
+                    else:
+                        job.finish(ERROR)
+                    return
+                with self._lock:
+                    self._counters['retries'] += 1
+                # Sleep, but wake up immediately if the job is cancelled.
+                if job.cancel_event.wait(delay):
+                    job.finish(CANCELLED)
+                    return
+
+    def _stream(self, job, deadline):
+        """Reads one attempt's chunks into the job. Returns DONE, CANCELLED or TIMEOUT.
+
+        `job.run()` is consumed on a helper thread so a call that hangs (even
+        before its first chunk) can't hold this worker past the deadline.
+        Errors from the stream are re-raised here.
+        """
+        events = queue.Queue()
+
+        def read():
+            try:
+                for chunk in job.run():
+                    events.put(('chunk', chunk))
+                    if job.cancel_event.is_set():
+                        return
+                events.put(('end', None))
+            except Exception as e:
+                events.put(('error', e))
+
+        threading.Thread(target=read, name=f"coach-stream-{job.id}", daemon=True).start()
+        while True:
+            if job.cancel_event.is_set():
+                return CANCELLED
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                job.cancel_event.set()  # the reader stops at its next chunk
+                return TIMEOUT
+            try:
+                kind, value = events.get(timeout=min(remaining, POLL_INTERVAL))
+            except queue.Empty:
+                continue
+            if kind == 'error':
+                raise value
+            if kind == 'end':
+                return DONE
+            if value:
+                job.first_chunk_at = job.first_chunk_at or time.perf_counter()
+                job.chunks.append(value)
+
+    def _wait_for_rate_limit(self, job, deadline):
+        """Reserves a rate-limit token, sleeping while THROTTLED. False if the job ended."""
+        if self.limiter is None or job.limit_key is None:
+            return True
+        wait = self.limiter.reserve(job.limit_key)
+        if wait is None or time.perf_counter() + wait > deadline:
+            job.retry_after = self.limiter.bucket(job.limit_key).retry_after()
+            job.finish(REJECTED)
+            return False
+        if wait > 0:
+            job.retry_after = wait
+            if not job.advance(THROTTLED):
+                return False
+            with self._lock:
+                self._counters['throttled'] += 1
+            cancelled = job.cancel_event.wait(wait)
+            job.throttled += wait
+            if cancelled:
+                job.finish(CANCELLED)
+                return False
+        return True
+
+    def metrics(self):
+        with self._lock:
+            for q in self._user_queues.values():
+                for job in q:
+                    job.check_deadline()
+            queued = [job for q in self._user_queues.values() for job in q if job.status == QUEUED]
+            now = time.perf_counter()
+            waits = sorted(self._waits_ms)
+            return {
+                'max_workers': self.max_workers,
+                'running': len(self._active_users),
+                'queue_depth': len(queued),
+                'oldest_wait_ms': round(max(((now - j.submitted_at) * 1000 for j in queued), default=0.0), 1),
+                'wait_ms_p50': round(percentile(waits, 0.5), 1),
+                'wait_ms_p95': round(percentile(waits, 0.95), 1),
+                **{k: v for k, v in self._counters.items()},
+            }
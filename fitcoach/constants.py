@@ -0,0 +1,75 @@
+"""Static data for the Streamlit app (ported from constants.ts).
+
+Kept in a module so it is built once per process instead of on every rerun. The
+exercise catalog lives in data/exercises.json (see fitcoach.catalog).
+"""
+import os
+
+# Bundled JSON data (exercise catalog, food table, plan rules).
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+CUSTOM_CSS = """
+<style>
+    .stChatInput { border-radius: 12px; }
+    .stChatMessage { border-radius: 12px; padding: 1rem; }
+    h1, h2, h3 { color: #4f46e5; }
+    .card {
+        background-color: white;
+        padding: 1.5rem;
+        border-radius: 0.75rem;
+        border: 1px solid #e5e7eb;
+        box-shadow: 0 1px 2px 0 rgba(0, 0, 0, 0.05);
+        margin-bottom: 1rem;
+    }
+    .card h4 { margin-top: 0; }
+    .card-meta { font-size: 12px; color: gray; }
+    .card-grid {
+        display: grid;
+        grid-template-columns: repeat(auto-fill, minmax(280px, 1fr));
+        gap: 1rem;
+    }
+    .card-grid .card { margin-bottom: 0; }
+    .split-day { margin-bottom: 1.25rem; }
+    .split-focus {
+        background-color: #eff6ff;
+        color: #1e40af;
+        padding: 0.75rem 1rem;
+        border-radius: 0.5rem;
+        margin: 0.5rem 0;
+    }
+    .metric-container {
+        display: flex;
+        justify-content: space-between;
+        align-items: center;
+        padding: 10px;
+        background-color: #f8fafc;
+        border-radius: 8px;
+        margin-bottom: 5px;
+    }
+    .stProgress > div > div > div > div { background-color: #4f46e5; }
+    button[kind="secondary"] {
+        background-color: #f1f5f9;
+        color: #475569;
+        border: none;
+    }
+</style>
+"""
+
+WEEKLY_SPLIT = {
+  "Monday": "Upper Body Strength (Push Focus) + Bone Loading",
+  "Tuesday": "Lower Body (Squat/Lunge) + Tibialis Work",
+  "Wednesday": "Active Recovery (Yoga + Core + Mobility)",
+  "Thursday": "Upper Body Strength (Pull Focus) + Posture",
+  "Friday": "Full Body Functional + High Impact (Bone density)",
+  "Saturday": "Cardio Zone 2 + Deep Stretch",
+  "Sunday": "Rest + Meal Prep + Mental Reset",
+}
+
+DIET_GUIDELINES = {'calories': 2300, 'protein': 120, 'water': 3.5, 'steps': 9000}
+
+DEFAULT_PROFILE = {
+    'name': 'Athlete', 'age': None, 'sex': None, 'weight': 60.0, 'height': "5'7\"",
+    'goal': 'Bone Strength & Lean Muscle', 'diet': 'Non-veg',
+    'workout_mode': 'Home', 'level': 'Intermediate', 'injuries': [], 'kegel_level': 1,
+    'timezone': None
+}
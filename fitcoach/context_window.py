@@ -0,0 +1,85 @@
+"""Token-budgeted history window for the AI Coach.
+
+The last few turns are sent verbatim; anything older is folded into a rolling
+summary. Folding is incremental: only the messages leaving the window are fed
+to the summarizer, together with the previous summary.
+"""
+import re
+
+SUMMARY_PREAMBLE = "Summary of our earlier conversation:"
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def extractive_summary(previous, messages, max_chars=1200):
+    """Offline summarizer: keeps the first sentence of every folded message."""
+    lines = [previous] if previous else []
+    for m in messages:
+        first = re.split(r"(?<=[.!?])\s", m["content"].strip(), maxsplit=1)[0]
+        who = "User" if m["role"] == "user" else "Coach"
+        lines.append(f"{who}: {first[:200]}")
+    text = "\n".join(lines)
+    # Keep the newest material when the summary outgrows its budget.
+    return text[-max_chars:]
+
+
+class ConversationWindow:
+    """Keeps the last `max_turns` turns within `token_budget`, summarizing the rest.
+
+    `summarizer(previous_summary, folded_messages) -> str` is called only when
+    messages leave the window. To avoid a summarizer call on every turn once a
+    chat is long, the window is folded down to `max_turns // 2` turns each time
+    it overflows.
+    """
+
+    def __init__(self, max_turns=8, token_budget=4000, summarizer=extractive_summary):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.summary = ""
+        self.folded = 0
+
+    def _fits(self, messages, max_turns):
+        turns = sum(1 for m in messages if m["role"] == "user")
+        tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        return turns <= max_turns and tokens + estimate_tokens(self.summary) <= self.token_budget
+
+    def update(self, transcript):
+        """Folds overflowing messages into the summary. Returns True if it changed."""
+        if self._fits(transcript[self.folded:], self.max_turns):
+            return False
+
+        keep_turns = max(1, self.max_turns // 2)
+        # Only cut at user messages so every kept turn starts with the question.
+        boundaries = [i for i in range(self.folded + 1, len(transcript)) if transcript[i]["role"] == "user"]
+        cut = boundaries[-1] if boundaries else self.folded
+        for i in boundaries:
+            if self._fits(transcript[i:], keep_turns):
+                cut = i
+                break
+        if cut <= self.folded:
+            return False
+
+        self.summary = self.summarizer(self.summary, transcript[self.folded:cut])
+        self.folded = cut
+        return True
+
+    def history(self, transcript):
+        """Messages to send: the summary (if any) followed by the verbatim window."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "user", "content": f"{SUMMARY_PREAMBLE}\n{self.summary}"})
+            messages.append({"role": "model", "content": "Noted. I'll keep that context in mind."})
+        messages.extend(transcript[self.folded:])
+        return messages
+
+    def stats(self, transcript):
+        sent = self.history(transcript)
+        return {
+            'history_messages': len(sent),
+            'history_tokens': sum(estimate_tokens(m["content"]) for m in sent),
+            'summarized_messages': self.folded,
+        }
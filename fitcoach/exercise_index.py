@@ -0,0 +1,147 @@
+"""Search index for the Exercise Library.
+
+Built once per process from the exercise catalog:
+
+* an inverted index token -> {exercise position: field weight},
+* a sorted token list for prefix lookups and a trigram -> tokens map for
+  typo-tolerant matches,
+* facet bitsets (Python ints, one bit per exercise) for mode, pattern, group
+  and level, so filters are a couple of integer ANDs.
+
+Any record attribute listed in FIELD_WEIGHTS is indexed when present, whether
+it holds a string or a sequence of strings.
+"""
+import bisect
+import re
+from collections import defaultdict
+
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'group': 2.0,
+    'muscle_group': 2.0,
+    'pattern': 1.5,
+    'level': 1.0,
+    'form_steps': 0.5,
+}
+FACETS = ('mode', 'pattern', 'group', 'level')
+
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.4
+FUZZY_MIN_SIMILARITY = 0.2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _values(value):
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+
+def _facet_values(field, value):
+    if field == 'group':
+        # 'Legs/Back' is filed under both Legs and Back.
+        return [part.strip() for v in _values(value) for part in v.split('/')]
+    return _values(value)
+
+
+class ExerciseIndex:
+
+    def __init__(self, catalog):
+        self.ids = list(catalog)
+        self.all_mask = (1 << len(self.ids)) - 1
+        self.postings = defaultdict(dict)
+        self.facets = {name: defaultdict(int) for name in FACETS}
+
+        for pos, ex_id in enumerate(self.ids):
+            record = catalog[ex_id]
+            bit = 1 << pos
+            for field, weight in FIELD_WEIGHTS.items():
+                for value in _values(getattr(record, field, None)):
+                    for token in tokenize(value):
+                        posting = self.postings[token]
+                        posting[pos] = max(posting.get(pos, 0.0), weight)
+            for token in tokenize(ex_id):
+                posting = self.postings[token]
+                posting[pos] = max(posting.get(pos, 0.0), FIELD_WEIGHTS['name'])
+            for field in FACETS:
+                for value in _facet_values(field, getattr(record, field, None)):
+                    self.facets[field][value] |= bit
+
+        self.tokens = sorted(self.postings)
+        self.trigram_tokens = defaultdict(set)
+        for token in self.tokens:
+            for gram in trigrams(token):
+                self.trigram_tokens[gram].add(token)
+        self.postings = dict(self.postings)
+        self.facets = {name: dict(values) for name, values in self.facets.items()}
+
+    def facet_values(self, field):
+        return sorted(self.facets[field])
+
+    def _expand(self, term):
+        """Index tokens matching `term` with their score factor."""
+        matches = {}
+        if term in self.postings:
+            matches[term] = 1.0
+        start = bisect.bisect_left(self.tokens, term)
+        for token in self.tokens[start:]:
+            if not token.startswith(term):
+                break
+            matches.setdefault(token, PREFIX_FACTOR)
+        if not matches and len(term) >= 3:
+            grams = trigrams(term)
+            candidates = set().union(*(self.trigram_tokens.get(g, ()) for g in grams))
+            for token in candidates:
+                other = trigrams(token)
+                similarity = len(grams & other) / len(grams | other)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    matches[token] = FUZZY_FACTOR * similarity
+        return matches
+
+    def search(self, query="", **filters):
+        """Ranked exercise ids matching every query term and every facet filter.
+
+        `filters` maps facet names to a value; None or "All" disables a filter.
+        Without query terms, matches keep catalog order.
+        """
+        mask = self.all_mask
+        for field, value in filters.items():
+            if value not in (None, "All"):
+                mask &= self.facets[field].get(value, 0)
+
+        terms = tokenize(query)
+        if not terms:
+            return [self.ids[pos] for pos in range(len(self.ids)) if mask >> pos & 1]
+
+        scores = defaultdict(float)
+        for term in terms:
+            term_mask = 0
+            for token, factor in self._expand(term).items():
+                for pos, weight in self.postings[token].items():
+                    if mask >> pos & 1:
+                        term_mask |= 1 << pos
+                        scores[pos] += weight * factor
+            mask &= term_mask
+            if not mask:
+                return []
+
+        hits = [pos for pos in scores if mask >> pos & 1]
+        hits.sort(key=lambda pos: (-scores[pos], pos))
+        return [self.ids[pos] for pos in hits]
+
+
+def paginate(results, page, page_size):
+    """Returns (page_items, page_count) with `page` counted from 1."""
+    page_count = max(1, -(-len(results) // page_size))
+    page = min(max(page, 1), page_count)
+    return results[(page - 1) * page_size:page * page_size], page_count
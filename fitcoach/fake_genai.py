@@ -0,0 +1,134 @@
+"""Local stand-in for `google.genai.Client`, for load tests and offline runs.
+
+Implements the parts of the client the app uses: `chats.create(...)` with
+`send_message_stream` / `send_message`, and `models.generate_content`. Replies
+are canned text streamed word by word after a configurable time to first
+token; a configurable share of calls fails with a transient API error.
+
+Enabled with COACH_FAKE_GEMINI, which is either "1" (defaults) or a comma
+separated option list, e.g.::
+
+    COACH_FAKE_GEMINI="latency=0.8,tokens_per_second=40,error_rate=0.05,seed=1"
+"""
+import random
+import threading
+import time
+
+DEFAULTS = {'latency': 0.5, 'tokens_per_second': 50.0, 'error_rate': 0.0, 'seed': None}
+
+REPLIES = (
+    "Aim for about 1.6 g of protein per kg of body weight, spread over three or four meals.",
+    "Keep the movement slow and controlled, brace your core and stop two reps short of failure.",
+    "Mild soreness is normal; sharp or joint pain is not. Swap the exercise and rest the area for a few days.",
+    "Drink water steadily through the day and add a glass before and after training.",
+    "Progressive overload builds bone as well as muscle: add a little load or volume every week.",
+)
+
+
+class FakeAPIError(Exception):
+    """Mimics google.genai.errors.APIError closely enough for retry handling."""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def parse_options(spec):
+    """Options from a COACH_FAKE_GEMINI value ("1" or "key=value,...")."""
+    options = dict(DEFAULTS)
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        key, value = (part.strip() for part in item.split("=", 1))
+        if key not in DEFAULTS:
+            raise ValueError(f"Unknown COACH_FAKE_GEMINI option: {key}")
+        options[key] = int(value) if key == 'seed' else float(value)
+    return options
+
+
+class _Text:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Behaviour:
+    """Shared latency/error model; thread-safe because workers call it concurrently."""
+
+    def __init__(self, latency, tokens_per_second, error_rate, seed):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+            code = self._random.choice((429, 503))
+            reply = self._random.choice(REPLIES)
+            jitter = self._random.uniform(0.8, 1.2)
+        if failed:
+            time.sleep(self.latency * jitter / 2)
+            raise FakeAPIError(code, "fake upstream error")
+        return reply, self.latency * jitter
+
+    def stream(self):
+        reply, ttft = self.draw()
+        time.sleep(ttft)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(1.0 / self.tokens_per_second)
+            yield _Text(word if i == len(words) - 1 else word + " ")
+
+
+class FakeChat:
+
+    def __init__(self, behaviour, model, history):
+        self._behaviour = behaviour
+        self.model = model
+        self._history = list(history or [])
+
+    def send_message_stream(self, message, config=None):
+        chunks = []
+        for chunk in self._behaviour.stream():
+            chunks.append(chunk.text)
+            yield chunk
+        self._history += [message, "".join(chunks)]
+
+    def send_message(self, message, config=None):
+        return _Text("".join(chunk.text for chunk in self.send_message_stream(message, config)))
+
+    def get_history(self, curated=False):
+        return list(self._history)
+
+
+class _Chats:
+
+    def __init__(self, behaviour):
+        self._behaviour = behaviour
+
+    def create(self, model=None, config=None, history=None):
+        return FakeChat(self._behaviour, model, history)
+
+
+class _Models:
+
+    def __init__(self, behaviour):
+        self._behaviour = behaviour
+
+    def generate_content(self, model=None, contents=None, config=None):
+        reply, latency = self._behaviour.draw()
+        time.sleep(latency)
+        return _Text(reply)
+
+
+class Client:
+    """Drop-in for `genai.Client(api_key=...)`; see module docstring for options."""
+
+    def __init__(self, api_key=None, latency=DEFAULTS['latency'], tokens_per_second=DEFAULTS['tokens_per_second'],
+                 error_rate=DEFAULTS['error_rate'], seed=DEFAULTS['seed']):
+        self.api_key = api_key
+        behaviour = _Behaviour(latency, tokens_per_second, error_rate, seed)
+        self.chats = _Chats(behaviour)
+        self.models = _Models(behaviour)
@@ -0,0 +1,169 @@
+"""Meal plans solved against the calorie and protein targets.
+
+Foods live in data/foods.json and are loaded once per process into NumPy
+arrays (`FoodTable`). A meal is a main (protein food) + base (carb) +
+optional side, each with a portion multiplier; every candidate meal of a
+slot and diet is enumerated once and kept as arrays of macros.
+
+Solving a day is vectorized: each slot's candidates are scored against that
+slot's share of the targets, the best SHORTLIST per slot are kept, and every
+combination of the four shortlists is scored at once by broadcasting (12^4
+day totals in one array). Reusing a main food is penalized, within the day
+and across the week, so the plan varies, and a little per-week noise keeps weeks from repeating.
+
+Weeks are memoized on (diet, calories, protein, week start), so the same
+targets cost one solve per week no matter how many users share them.
+"""
+import collections
+import datetime
+import functools
+import itertools
+import json
+import os
+
+import numpy as np
+
+from fitcoach.constants import DATA_DIR
+
+FOODS_PATH = os.path.join(DATA_DIR, 'foods.json')
+
+SLOTS = ('Breakfast', 'Lunch', 'Snack', 'Dinner')
+DIETS = ('Veg', 'Non-veg')
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+# Share of the daily targets each slot aims for before the day is balanced.
+SLOT_SHARES = np.array([0.25, 0.35, 0.12, 0.28])
+PORTIONS = {'protein': (1.0, 1.5, 2.0), 'carb': (1.0, 1.5), 'side': (0.0, 1.0)}
+
+SHORTLIST = 12
+PROTEIN_WEIGHT = 2.0  # a protein shortfall costs twice as much as the same calorie miss
+PROTEIN_EXCESS_WEIGHT = 0.25  # going over the protein target is fine, within reason
+REPEAT_PENALTY = 0.05  # per earlier use of the same main food this week
+SAME_DAY_PENALTY = 0.15  # per pair of the day's meals sharing a main food
+WEEK_NOISE = 0.02
+
+Meal = collections.namedtuple('Meal', 'slot name items calories protein carbs fat')
+DayPlan = collections.namedtuple('DayPlan', 'date meals calories protein carbs fat')
+
+
+class FoodTable:
+    """Foods as parallel arrays; `macros` is (n_foods, 4) in MACROS order."""
+
+    def __init__(self, foods):
+        self.names = [f['name'] for f in foods]
+        self.servings = [f['serving'] for f in foods]
+        self.roles = np.array([f['role'] for f in foods])
+        self.macros = np.array([[f[m] for m in MACROS] for f in foods], dtype=float)
+        self.in_slot = np.array([[slot in f['slots'] for slot in SLOTS] for f in foods])
+        self.in_diet = np.array([[diet in f['diets'] for diet in DIETS] for f in foods])
+
+    def select(self, role, slot, diet):
+        mask = (self.roles == role) & self.in_slot[:, SLOTS.index(slot)] & self.in_diet[:, DIETS.index(diet)]
+        return np.flatnonzero(mask)
+
+
+@functools.lru_cache(maxsize=None)
+def load_foods(path=FOODS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return FoodTable(json.load(f)['foods'])
+
+
+@functools.lru_cache(maxsize=None)
+def meal_candidates(slot, diet):
+    """Every (main, base, side) meal for a slot: (foods, portions, macros) arrays.
+
+    `foods` and `portions` are (n, 3); a side portion of 0 means no side.
+    """
+    table = load_foods()
+    sides = table.select('side', slot, diet)
+    grids = np.meshgrid(
+        table.select('protein', slot, diet), PORTIONS['protein'],
+        table.select('carb', slot, diet), PORTIONS['carb'],
+        sides if len(sides) else np.array([0]), PORTIONS['side'] if len(sides) else (0.0,),
+        indexing='ij',
+    )
+    main, main_portion, base, base_portion, side, side_portion = (g.ravel() for g in grids)
+    # "No side" is the same meal for every side food; keep one copy.
+    keep = (side_portion > 0) | (side == side.min())
+    foods = np.stack([main, base, side], axis=1)[keep]
+    portions = np.stack([main_portion, base_portion, side_portion], axis=1)[keep]
+    macros = np.einsum('nk,nkm->nm', portions, table.macros[foods])
+    return foods, portions, macros
+
+
+def _score(day_calories, day_protein, calories, protein):
+    protein_gap = (day_protein - protein) / protein
+    return (np.abs(day_calories - calories) / calories
+            + PROTEIN_WEIGHT * np.maximum(0.0, -protein_gap)
+            + PROTEIN_EXCESS_WEIGHT * np.maximum(0.0, protein_gap))
+
+
+def _outer_sum(vectors):
+    return functools.reduce(np.add.outer, vectors)
+
+
+def _solve_day(calories, protein, diet, used, rng):
+    shortlists, totals, penalties = [], [], []
+    for slot, share in zip(SLOTS, SLOT_SHARES):
+        foods, portions, macros = meal_candidates(slot, diet)
+        penalty = REPEAT_PENALTY * used[foods[:, 0]] + rng.uniform(0, WEEK_NOISE, len(foods))
+        score = _score(macros[:, 0], macros[:, 1], calories * share, protein * share) + penalty
+        top = np.argsort(score, kind='stable')[:SHORTLIST]
+        shortlists.append((slot, foods[top], portions[top], macros[top]))
+        totals.append(macros[top])
+        penalties.append(penalty[top])
+
+    day_calories = _outer_sum([m[:, 0] for m in totals])
+    day_protein = _outer_sum([m[:, 1] for m in totals])
+    score = _score(day_calories, day_protein, calories, protein) + _outer_sum(penalties)
+    for a, b in itertools.combinations(range(len(SLOTS)), 2):
+        same = shortlists[a][1][:, 0, None] == shortlists[b][1][None, :, 0]
+        shape = [1] * len(SLOTS)
+        shape[a], shape[b] = same.shape
+        score += SAME_DAY_PENALTY * same.reshape(shape)
+    best = np.unravel_index(np.argmin(score), score.shape)
+    return [(slot, foods[i], portions[i], macros[i]) for (slot, foods, portions, macros), i in zip(shortlists, best)]
+
+
+def _meal(slot, foods, portions, macros):
+    table = load_foods()
+    items, names = [], []
+    for food, portion in zip(foods, portions):
+        if portion == 0:
+            continue
+        names.append(table.names[food])
+        amount = "" if portion == 1 else f"{portion:g}× "
+        items.append(f"{amount}{table.names[food]} ({table.servings[food]})")
+    name = f"{names[0]} & {names[1]}" + (f" + {names[2]}" if len(names) > 2 else "")
+    return Meal(slot, name, tuple(items), *(int(round(v)) for v in macros))
+
+
+@functools.lru_cache(maxsize=1024)
+def week_plan(week_start, diet, calories, protein):
+    """Seven DayPlans from `week_start` (a Monday) for the given diet and targets."""
+    rng = np.random.default_rng([week_start.toordinal(), DIETS.index(diet), int(calories), int(protein)])
+    used = np.zeros(len(load_foods().names))
+    days = []
+    for offset in range(7):
+        picks = _solve_day(calories, protein, diet, used, rng)
+        for _, foods, _, _ in picks:
+            used[foods[0]] += 1
+        meals = tuple(_meal(*pick) for pick in picks)
+        totals = (sum(getattr(m, macro) for m in meals) for macro in MACROS)
+        days.append(DayPlan(week_start + datetime.timedelta(days=offset), meals, *totals))
+    return tuple(days)
+
+
+def plan_key(profile, guidelines):
+    """Memoization key (diet, calories, protein) from a profile and DIET_GUIDELINES."""
+    diet = profile.get('diet', 'Veg')
+    return (diet if diet in DIETS else 'Veg', guidelines['calories'], guidelines['protein'])
+
+
+def day_plan(date, diet, calories, protein):
+    monday = date - datetime.timedelta(days=date.weekday())
+    return week_plan(monday, diet, calories, protein)[date.weekday()]
+
+
+def plans_for_range(start, days, diet, calories, protein):
+    """Batch API: DayPlans for `days` days from `start`, one solve per week touched."""
+    return [day_plan(start + datetime.timedelta(days=i), diet, calories, protein) for i in range(days)]
@@ -0,0 +1,54 @@
+"""The coach's system instruction, built from the user's profile.
+
+Only PROMPT_FIELDS go into the instruction, so changing other settings
+(timezone, kegel level, ...) keeps the reply cache warm; the instruction is
+part of the cache key. Free-text fields are flattened to a single short line
+before they reach the prompt.
+"""
+import functools
+import re
+
+PERSONA = "You are Dr. Fit, an expert Sports Medicine Physician, Strength & Conditioning Coach, and Nutritionist."
+KNOWLEDGE = "Core Knowledge: Wolff's Law (Bone density), Axial Loading, Progressive Overload."
+STYLE = "Be concise, clinical, and encouraging."
+EXPERT_SUFFIX = "\n\n*** EXPERT MODE ***\nUse deep reasoning to analyze biomechanics and physiology."
+
+PROMPT_FIELDS = ('name', 'age', 'sex', 'weight', 'height', 'goal', 'workout_mode', 'level', 'diet', 'injuries')
+MAX_FIELD_CHARS = 60
+
+
+def _clean(value):
+    return re.sub(r"\s+", " ", str(value)).strip()[:MAX_FIELD_CHARS]
+
+
+def prompt_key(profile):
+    """The profile fields the instruction depends on, as a hashable tuple."""
+    return tuple(
+        tuple(sorted(profile.get(f) or ())) if f == 'injuries' else profile.get(f)
+        for f in PROMPT_FIELDS
+    )
+
+
+def system_instruction(profile):
+    return _build(prompt_key(profile))
+
+
+@functools.lru_cache(maxsize=1024)
+def _build(key):
+    p = dict(zip(PROMPT_FIELDS, key))
+    sex = {'Male': 'M', 'Female': 'F'}.get(p['sex'], '')
+    stats = [f"{p['age']}{sex}" if p['age'] else sex]
+    stats += [f"{p['weight']:g}kg" if p['weight'] else "", _clean(p['height'] or "")]
+    if p['goal']:
+        stats.append(f"Goal: {_clean(p['goal'])}")
+    stats = ", ".join(s for s in stats if s)
+    athlete = _clean(p['name'] or "") or "the athlete"
+    lines = [
+        PERSONA,
+        f"You are coaching {athlete}" + (f" ({stats})." if stats else "."),
+        f"Training: {p['workout_mode']} workouts, {p['level']} level. Diet: {p['diet']}.",
+    ]
+    if p['injuries']:
+        lines.append(f"Reported injuries / pain: {', '.join(p['injuries'])}.")
+    lines += [KNOWLEDGE, STYLE]
+    return "\n".join(lines)
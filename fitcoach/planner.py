@@ -0,0 +1,123 @@
+"""Rule-table driven workout plans.
+
+The day/mode routines, level substitutions, recovery overrides and injury
+swaps live in data/plan_rules.json (ported from utils/planGenerator.ts). The
+table is loaded once per process and plans are memoized on their inputs, so a
+rerun with unchanged inputs is a dictionary lookup.
+"""
+import datetime
+import functools
+import json
+import os
+
+from fitcoach.constants import DATA_DIR
+
+RULES_PATH = os.path.join(DATA_DIR, 'plan_rules.json')
+
+
+@functools.lru_cache(maxsize=None)
+def load_rules(path=RULES_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def recovery_score(soreness=0, energy=10):
+    """'Low' | 'Medium' | 'High', same thresholds as generateDailyPlan."""
+    if soreness > 7 or energy < 4:
+        return 'Low'
+    if soreness > 4:
+        return 'Medium'
+    return 'High'
+
+
+def _swap(exercises, table):
+    """Applies a {exercise: replacement-or-None} table, dropping duplicates."""
+    out = []
+    for ex_id in exercises:
+        ex_id = table.get(ex_id, ex_id)
+        if ex_id is not None and ex_id not in out:
+            out.append(ex_id)
+    return out
+
+
+@functools.lru_cache(maxsize=64)
+def injury_table(injuries):
+    """One swap table for all flagged `injuries` (a sorted tuple).
+
+    A replacement that another flagged injury rules out is followed through
+    that injury's table too, and dropped if the chain loops, so no flagged
+    movement comes back whatever order the injuries are listed in.
+    """
+    tables = [load_rules()['injuries'].get(injury, {}) for injury in injuries]
+    merged = {}
+    for table in tables:
+        for ex_id, replacement in table.items():
+            merged.setdefault(ex_id, replacement)
+    resolved = {}
+    for ex_id, replacement in merged.items():
+        seen = {ex_id}
+        while replacement in merged and replacement not in seen:
+            seen.add(replacement)
+            replacement = merged[replacement]
+        resolved[ex_id] = None if replacement in seen else replacement
+    return resolved
+
+
+@functools.lru_cache(maxsize=4096)
+def daily_plan(date, workout_mode, level='Intermediate', injuries=(), recovery='High'):
+    """Returns (morning, workout, evening) exercise id tuples for `date`.
+
+    `injuries` must be hashable (a sorted tuple such as ('Back', 'Knee')); use
+    `plan_key` to build the arguments from a profile.
+    """
+    rules = load_rules()
+    day = rules['days'].get(date.strftime('%A'), {})
+    workout = list(day.get(workout_mode, day.get('*', [])))
+
+    recovery_rules = rules['recovery'].get(recovery, {})
+    if workout and 'workout' in recovery_rules:
+        workout = list(recovery_rules['workout'])
+    else:
+        workout = _swap(workout, rules['levels'].get(level, {}))
+        workout = _swap(workout, recovery_rules.get('swap', {}))
+
+    morning = list(rules['routines']['morning'])
+    evening = list(rules['routines']['evening'])
+    # Injury swaps run last so no other rule can reintroduce a flagged movement.
+    table = injury_table(injuries)
+    morning, workout, evening = _swap(morning, table), _swap(workout, table), _swap(evening, table)
+    return tuple(morning), tuple(workout), tuple(evening)
+
+
+def plan_key(profile, soreness=0):
+    """Memoization key for `daily_plan` derived from a user profile."""
+    return (
+        profile['workout_mode'],
+        profile.get('level', 'Intermediate'),
+        tuple(sorted(profile.get('injuries', []))),
+        recovery_score(soreness),
+    )
+
+
+def plans_for_range(start, days, workout_mode, level='Intermediate', injuries=(), recovery='High'):
+    """Batch API: [(date, (morning, workout, evening)), ...] for `days` days from `start`.
+
+    Future days have no soreness data yet, so the default assumes full recovery.
+    """
+    injuries = tuple(sorted(injuries))
+    return [
+        (d, daily_plan(d, workout_mode, level, injuries, recovery))
+        for d in (start + datetime.timedelta(days=i) for i in range(days))
+    ]
+
+
+def week_plans(any_day, workout_mode, level='Intermediate', injuries=(), recovery='High'):
+    """Monday-to-Sunday plans for the week containing `any_day`."""
+    monday = any_day - datetime.timedelta(days=any_day.weekday())
+    return plans_for_range(monday, 7, workout_mode, level, injuries, recovery)
+
+
+def planned_tasks_by_weekday(profile):
+    """Planned task count (morning + workout + evening) for Monday..Sunday."""
+    week = week_plans(datetime.date(2024, 1, 1), *plan_key(profile)[:3])
+    return [sum(len(part) for part in plan) for _, plan in week]
@@ -0,0 +1,70 @@
+"""Token-bucket rate limiting for Gemini calls, per (API key, model).
+
+Limits are expressed as (requests per minute, burst). A caller reserves a
+token and is told how long to wait for it; if the wait would exceed
+`max_wait` nothing is reserved and the caller should report a throttled
+state instead of hitting the API and getting a quota error.
+"""
+import hashlib
+import threading
+import time
+
+# (requests per minute, burst) per model; anything else uses DEFAULT_LIMIT.
+DEFAULT_LIMITS = {
+    'gemini-3-pro-preview': (10, 3),
+    'gemini-2.5-flash-lite-latest': (60, 10),
+}
+DEFAULT_LIMIT = (30, 5)
+
+
+class TokenBucket:
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Takes one token. Returns seconds to wait before using it, or None
+        (and takes nothing) if that would be longer than `max_wait`."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+    def retry_after(self):
+        """Seconds until a token is free (without reserving)."""
+        with self._lock:
+            tokens = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+            return 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+
+
+class RateLimiter:
+
+    def __init__(self, limits=None, max_wait=10.0):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(api_key, model_id):
+        # Never keep raw API keys around as dictionary keys.
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16], model_id
+
+    def bucket(self, key):
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(*self.limits.get(key[1], DEFAULT_LIMIT))
+            return self._buckets[key]
+
+    def reserve(self, key):
+        """See TokenBucket.reserve; uses this limiter's `max_wait`."""
+        return self.bucket(key).reserve(self.max_wait)
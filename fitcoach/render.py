@@ -0,0 +1,77 @@
+"""Pre-rendered HTML for the Exercise Library and the Weekly Split.
+
+Each of these pages is sent as one `st.markdown` block (one delta) instead of
+one element per card or day. The HTML is memoized per process:
+
+* a card per (catalog version, exercise id),
+* a library page per (catalog version, query, filters, page),
+* the weekly split per (catalog version, week of workouts).
+
+Repeat views, from any session, only look up a cached string. The HTML is
+emitted on a single line so Markdown never treats part of it as a code block.
+"""
+import functools
+import html
+
+from fitcoach import catalog
+from fitcoach.exercise_index import paginate, tokenize
+
+LIBRARY_PAGE_SIZE = 10
+
+
+def _text(value):
+    return html.escape(str(value), quote=True)
+
+
+@functools.lru_cache(maxsize=None)
+def card_html(version, ex_id):
+    ex = catalog.load_catalog().details(ex_id)
+    video = f'<a href="{_text(ex.video)}" target="_blank">▶ Watch Tutorial</a>' if ex.video else ""
+    return (
+        f'<div class="card"><h4>{_text(ex.name)}</h4>'
+        f'<p class="card-meta">{_text(ex.group)} | {_text(", ".join(ex.mode))} | {_text(ex.level)}</p>'
+        f'<p><b>{_text(ex.prescription)}</b></p>{video}</div>'
+    )
+
+
+def _filters(query, mode, pattern, group):
+    # Queries that tokenize the same share one cache entry.
+    return " ".join(tokenize(query)), mode, pattern, group
+
+
+def library_results(index, version, query="", mode="All", pattern="All", group="All"):
+    """Matching exercise ids (a tuple) for the library filters."""
+    return _results(index, version, *_filters(query, mode, pattern, group))
+
+
+@functools.lru_cache(maxsize=256)
+def _results(index, version, query, mode, pattern, group):
+    return tuple(index.search(query, mode=mode, pattern=pattern, group=group))
+
+
+def library_page(index, version, query="", mode="All", pattern="All", group="All", page=1,
+                 page_size=LIBRARY_PAGE_SIZE):
+    """One page of library cards as a single HTML grid."""
+    return _page(index, version, *_filters(query, mode, pattern, group), page, page_size)
+
+
+@functools.lru_cache(maxsize=512)
+def _page(index, version, query, mode, pattern, group, page, page_size):
+    visible, _ = paginate(_results(index, version, query, mode, pattern, group), page, page_size)
+    return '<div class="card-grid">' + "".join(card_html(version, ex_id) for ex_id in visible) + "</div>"
+
+
+@functools.lru_cache(maxsize=64)
+def weekly_split_html(version, days):
+    """`days` is a tuple of (day, focus, workout exercise ids)."""
+    details = catalog.load_catalog().details
+    blocks = []
+    for day, focus, workout in days:
+        names = " · ".join(details(ex_id).name for ex_id in workout)
+        blocks.append(
+            f'<div class="split-day"><b>{_text(day)}</b>'
+            f'<div class="split-focus">{_text(focus)}</div>'
+            + (f'<p class="card-meta">{_text(names)}</p>' if names else "")
+            + "</div>"
+        )
+    return '<div class="split-week">' + "".join(blocks) + "</div>"
@@ -0,0 +1,149 @@
+"""Background day rollover and rollup job.
+
+A daemon thread wakes up every `interval` seconds. For every user whose local
+day (profile 'timezone', server time when unset) has moved on since the last
+run, it compacts each finished day's log into a history row (protein, water,
+steps, soreness, tasks and task-completion rate) and recomputes the weekly
+and monthly rollups those days fall into. The Progress page reads the
+rollups instead of aggregating raw rows on every render.
+
+All writes are upserts, so running the job twice (or in two processes) is
+harmless. NumPy (via fitcoach.analytics) is imported only when rollups are
+computed, so importing this module for `local_today` stays cheap.
+"""
+import datetime
+import logging
+import threading
+import time
+import zoneinfo
+
+from fitcoach import planner
+from fitcoach.constants import DEFAULT_PROFILE
+from fitcoach.storage import DAILY_FIELDS, HISTORY_FIELDS
+
+logger = logging.getLogger("fitcoach.rollover")
+
+PERIODS = ('week', 'month')
+
+
+def local_today(timezone=None, now=None):
+    """The calendar date in `timezone` (IANA name); server-local when None."""
+    if not timezone:
+        return (now.astimezone() if now else datetime.datetime.now()).date()
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return now.astimezone(zoneinfo.ZoneInfo(timezone)).date()
+
+
+def compact_day(storage, user_id, day, planned):
+    """Writes the history row for one finished day; `planned` is that day's task count."""
+    log = storage.load_daily_log(user_id, day)
+    tasks = len(log['completed_tasks'])
+    row = {'date': day, 'tasks': tasks, **{field: log[field] for field in DAILY_FIELDS}}
+    row['completion'] = min(1.0, tasks / planned) if planned else None
+    storage.append_history(user_id, row)
+
+
+def refresh_rollups(storage, user_id, planned_by_weekday, since=None):
+    """Recomputes week and month rollups from `since` (an ISO day; all when None).
+
+    Rows without a stored completion rate (manual or imported entries) get
+    one from their task count and `planned_by_weekday`.
+    """
+    import numpy as np
+    from fitcoach import analytics
+
+    first = dict.fromkeys(PERIODS, np.datetime64('0001-01-01'))
+    if since:
+        # Rows are loaded from the Monday of the week holding the 1st of
+        # `since`'s month, so every week and month touched from `since` on is
+        # recomputed from all its rows. Earlier periods in those rows are
+        # partial and are not saved.
+        first['month'] = analytics.period_start(np.array([since], dtype='datetime64[D]'), 'month')[0]
+        first['week'] = analytics.period_start(np.array([first['month']]), 'week')[0]
+    rows = storage.load_history(user_id, str(first['week']) if since else None)
+    if not rows:
+        return
+    days = np.array([r['date'] for r in rows], dtype='datetime64[D]')
+    columns = {f: np.array([np.nan if r[f] is None else r[f] for r in rows], dtype=float) for f in HISTORY_FIELDS}
+    planned = np.asarray(planned_by_weekday, dtype=float)[analytics.weekday(days)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        derived = np.clip(np.where(planned > 0, columns['tasks'] / planned, np.nan), 0.0, 1.0)
+    columns['completion'] = np.where(np.isnan(columns['completion']), derived, columns['completion'])
+
+    for period in PERIODS:
+        starts, counts, means = analytics.period_means(days, columns, period)
+        storage.save_rollups(user_id, period, [
+            {'start': str(s), 'days': int(n), **{f: None if np.isnan(means[f][i]) else float(means[f][i]) for f in means}}
+            for i, (s, n) in enumerate(zip(starts, counts)) if s >= first[period]
+        ])
+
+
+def compact_days(storage, user_id, days, profile):
+    """Compacts the given ISO days (ascending) and refreshes the rollups they touch."""
+    if not days:
+        return
+    planned = planner.planned_tasks_by_weekday(profile)
+    for day in days:
+        compact_day(storage, user_id, day, planned[datetime.date.fromisoformat(day).weekday()])
+    refresh_rollups(storage, user_id, planned, since=days[0])
+
+
+def roll_over_user(storage, user_id, now=None):
+    """Compacts the user's finished days. Returns how many days were compacted."""
+    profile = {**DEFAULT_PROFILE, **(storage.load_profile(user_id) or {})}
+    today = local_today(profile.get('timezone'), now)
+    yesterday = (today - datetime.timedelta(days=1)).isoformat()
+    last = storage.last_rollover(user_id)
+    if last is not None and last >= yesterday:
+        return 0
+    days = storage.pending_days(user_id, after=last, before=today.isoformat())
+    compact_days(storage, user_id, days, profile)
+    storage.set_last_rollover(user_id, yesterday)
+    return len(days)
+
+
+class RolloverScheduler:
+    """Runs `roll_over_user` for every user on a background thread."""
+
+    def __init__(self, storage, interval=60.0):
+        self.storage = storage
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'runs': 0, 'days_compacted': 0, 'errors': 0, 'last_run_ms': None, 'last_run_at': None}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="fitcoach-rollover", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def run_once(self, now=None):
+        started = time.perf_counter()
+        compacted = errors = 0
+        for user_id in self.storage.list_users():
+            try:
+                compacted += roll_over_user(self.storage, user_id, now)
+            except Exception:
+                errors += 1
+                logger.exception("Rollover failed for user %s", user_id)
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['days_compacted'] += compacted
+            self._stats['errors'] += errors
+            self._stats['last_run_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self._stats['last_run_at'] = round(time.time(), 3)
+        return compacted
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, interval_s=self.interval)
@@ -0,0 +1,106 @@
+"""Local prompt routing for the coach's "Auto" mode.
+
+Each prompt is scored with cheap keyword and shape heuristics (no model call):
+pain/injury terms weigh most, biomechanics and "why/explain" questions add to
+the score, short nutrition/logging questions subtract. Prompts below
+`ESCALATE_SCORE` go to the fast model; the rest go to the thinking model with
+a budget that grows with the score.
+
+Observed reply times are kept per (model, thinking budget) so the UI can show
+an estimate of the time a routed reply saved compared with full Expert mode.
+The Expert baseline comes only from observed full-budget Expert replies (a
+thinking budget is a cap, not a cost, so smaller budgets say little about
+it); until one has been seen there is no estimate. Observations are model
+time only, without queue or throttle wait.
+"""
+import collections
+import re
+import threading
+
+FAST_MODEL = "gemini-2.5-flash-lite-latest"
+THINKING_MODEL = "gemini-3-pro-preview"
+EXPERT_BUDGET = 32768
+
+INJURY_TERMS = {
+    'pain', 'painful', 'hurt', 'hurts', 'injury', 'injured', 'sprain', 'strain', 'tendon', 'tendinitis',
+    'ache', 'aches', 'swelling', 'swollen', 'numb', 'tingling', 'sciatica', 'clicking', 'popping',
+    'rehab', 'physio', 'fracture', 'stiff', 'inflamed',
+}
+BIOMECHANICS_TERMS = {
+    'form', 'technique', 'biomechanics', 'posture', 'valgus', 'hinge', 'mobility', 'alignment',
+    'compensation', 'activation', 'depth', 'tempo', 'range', 'rom', 'bracing', 'leverage', 'joint',
+    'spine', 'knee', 'knees', 'hip', 'hips', 'shoulder', 'shoulders', 'ankle', 'wrist', 'elbow',
+}
+SIMPLE_TERMS = {
+    'protein', 'calories', 'calorie', 'macros', 'carbs', 'fat', 'water', 'meal', 'meals', 'eat',
+    'breakfast', 'lunch', 'dinner', 'snack', 'log', 'logged', 'steps', 'grams', 'sleep', 'schedule',
+}
+_DEEP_QUESTION_RE = re.compile(r"\b(why|explain|how come|what causes|difference between|should i worry)\b")
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+ESCALATE_SCORE = 1.5
+# Thinking budget per score, from ESCALATE_SCORE upwards.
+THINKING_BUDGETS = ((1.5, 4096), (3.0, 8192), (4.5, 16384), (6.0, EXPERT_BUDGET))
+
+LATENCY_SMOOTHING = 0.2
+
+Route = collections.namedtuple('Route', 'mode model_id thinking_budget score reason')
+
+
+def score_prompt(prompt):
+    """Returns (score, reason). Higher means more reasoning is warranted."""
+    text = prompt.lower()
+    words = _TOKEN_RE.findall(text)
+    vocab = set(words)
+    injury = len(vocab & INJURY_TERMS)
+    biomechanics = len(vocab & BIOMECHANICS_TERMS)
+    simple = len(vocab & SIMPLE_TERMS)
+    score = 2.0 * injury + 1.5 * biomechanics
+    if _DEEP_QUESTION_RE.search(text):
+        score += 1.0
+    if len(words) > 40:
+        score += 1.0
+    if simple and not injury:
+        score -= 1.0
+    if injury:
+        reason = "pain/injury"
+    elif biomechanics:
+        reason = "biomechanics"
+    elif simple:
+        reason = "nutrition/logging"
+    else:
+        reason = "general"
+    return score, reason
+
+
+def route(prompt):
+    """Picks the model and thinking budget for one prompt."""
+    score, reason = score_prompt(prompt)
+    if score < ESCALATE_SCORE:
+        return Route("Standard", FAST_MODEL, None, score, reason)
+    budget = max(b for threshold, b in THINKING_BUDGETS if score >= threshold)
+    return Route("Expert", THINKING_MODEL, budget, score, reason)
+
+
+_lock = threading.Lock()
+_latency = {}
+
+
+def observe(model_id, thinking_budget, seconds):
+    """Folds one observed reply time into the running estimate."""
+    key = (model_id, thinking_budget)
+    with _lock:
+        previous = _latency.get(key)
+        _latency[key] = seconds if previous is None else previous + LATENCY_SMOOTHING * (seconds - previous)
+
+
+def expert_latency():
+    """Observed latency (seconds) of full Expert replies, or None before the first one."""
+    with _lock:
+        return _latency.get((THINKING_MODEL, EXPERT_BUDGET))
+
+
+def latency_saved(seconds):
+    """Estimated seconds saved versus answering in full Expert mode; None without a baseline."""
+    baseline = expert_latency()
+    return None if baseline is None else max(0.0, baseline - seconds)
@@ -0,0 +1,91 @@
+"""Per-session memory accounting.
+
+`measure(session_state)` estimates how many bytes each session-state key
+holds. It follows plain containers and this package's own objects and counts
+NumPy arrays with the data they own; anything else (SDK chat objects, locks,
+shared clients) is counted shallowly, since it is either shared across
+sessions or mirrored by the transcript. The estimate is for spotting outliers
+and sizing a deployment, not an exact heap profile.
+
+`record()` keeps the latest measurement per session in a process-wide table
+and `report()` summarizes it for the debug panel. Sessions that have not run
+for STALE_SECONDS drop out of the table; `forget()` drops one at once.
+"""
+import sys
+import threading
+import time
+
+from fitcoach.timing import percentile
+
+STALE_SECONDS = 3600
+TOP_KEYS = 5
+
+_lock = threading.Lock()
+_sessions = {}
+
+
+def deep_sizeof(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    # For NumPy arrays getsizeof already includes the data they own, so
+    # they need no special case (and measuring never imports NumPy).
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(item, seen) for item in obj)
+    if type(obj).__module__.startswith('fitcoach.'):
+        attrs = getattr(obj, '__dict__', None) or {
+            name: getattr(obj, name) for name in getattr(type(obj), '__slots__', ()) if hasattr(obj, name)
+        }
+        return size + sum(deep_sizeof(v, seen) for v in attrs.values() if not callable(v))
+    return size
+
+
+def measure(session_state):
+    """Returns (total_bytes, {key: bytes}) for a session's state."""
+    seen = set()
+    by_key = {str(key): deep_sizeof(session_state[key], seen) for key in list(session_state.keys())}
+    return sum(by_key.values()), by_key
+
+
+def record(session_id, user_id, session_state):
+    """Measures a session and stores the result. Returns the total in bytes."""
+    total, by_key = measure(session_state)
+    top = dict(sorted(by_key.items(), key=lambda kv: kv[1], reverse=True)[:TOP_KEYS])
+    now = time.time()
+    with _lock:
+        _sessions[session_id] = {'user': user_id, 'bytes': total, 'top_keys': top, 'ts': now}
+        for sid in [sid for sid, entry in _sessions.items() if now - entry['ts'] > STALE_SECONDS]:
+            del _sessions[sid]
+    return total
+
+
+def forget(session_id):
+    """Drops a session's entry (on reset or when it switches user)."""
+    with _lock:
+        _sessions.pop(session_id, None)
+
+
+def report():
+    """Process-wide summary: session count, total/mean/p95/max bytes and the largest sessions."""
+    with _lock:
+        entries = sorted(_sessions.values(), key=lambda e: e['bytes'], reverse=True)
+    sizes = sorted(e['bytes'] for e in entries)
+    p95 = percentile(sizes, 0.95)
+    return {
+        'sessions': len(sizes),
+        'total_kb': round(sum(sizes) / 1024, 1),
+        'mean_kb': round(sum(sizes) / len(sizes) / 1024, 1) if sizes else 0.0,
+        'p95_kb': round(p95 / 1024, 1),
+        'max_kb': round(sizes[-1] / 1024, 1) if sizes else 0.0,
+        'largest': [
+            {'user': e['user'], 'kb': round(e['bytes'] / 1024, 1),
+             'top_keys_kb': {k: round(v / 1024, 1) for k, v in e['top_keys'].items()}}
+            for e in entries[:TOP_KEYS]
+        ],
+    }
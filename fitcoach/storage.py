@@ -0,0 +1,491 @@
+"""Persistent storage for user profiles, daily logs and history.
+
+`open_storage(url)` picks a backend from the URL scheme; SQLite is the default
+and the only built-in backend. Writes are field-level (e.g. `+10g` protein
+becomes a single `UPDATE ... SET protein = protein + 10`) and history is read
+by date range so long-time users don't load years of rows on every rerun.
+Bulk readers (`iter_*`) page through rows with keyset pagination and bulk
+writers take whole batches in one transaction, for import/export.
+
+Finished days are compacted into history rows by the rollover job
+(fitcoach.rollover), which also stores weekly/monthly rollups here. Chat
+messages that a session pages out of memory are archived per user.
+"""
+import abc
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+DAILY_FIELDS = ('protein', 'water', 'steps', 'soreness')
+HISTORY_FIELDS = ('weight', 'tasks') + DAILY_FIELDS + ('completion',)
+ROLLUP_FIELDS = ('days',) + HISTORY_FIELDS
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version).
+_MIGRATIONS = [
+    """
+    CREATE TABLE profile_fields (
+        user_id TEXT NOT NULL,
+        field TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (user_id, field)
+    );
+    CREATE TABLE daily_logs (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        protein INTEGER NOT NULL DEFAULT 0,
+        water REAL NOT NULL DEFAULT 0,
+        steps INTEGER NOT NULL DEFAULT 0,
+        soreness INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    );
+    CREATE TABLE completed_tasks (
+        user_id TEXT NOT NULL,
+        day TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        PRIMARY KEY (user_id, day, task_id)
+    );
+    CREATE TABLE history (
+        user_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        weight REAL,
+        tasks INTEGER,
+        PRIMARY KEY (user_id, date)
+    );
+    """,
+    """
+    ALTER TABLE history ADD COLUMN protein INTEGER;
+    ALTER TABLE history ADD COLUMN water REAL;
+    ALTER TABLE history ADD COLUMN steps INTEGER;
+    ALTER TABLE history ADD COLUMN soreness INTEGER;
+    ALTER TABLE history ADD COLUMN completion REAL;
+    CREATE TABLE rollover_state (
+        user_id TEXT PRIMARY KEY,
+        last_day TEXT NOT NULL
+    );
+    CREATE TABLE rollups (
+        user_id TEXT NOT NULL,
+        period TEXT NOT NULL,
+        start TEXT NOT NULL,
+        days INTEGER NOT NULL,
+        weight REAL,
+        tasks REAL,
+        protein REAL,
+        water REAL,
+        steps REAL,
+        soreness REAL,
+        completion REAL,
+        PRIMARY KEY (user_id, period, start)
+    );
+    """,
+    """
+    CREATE TABLE chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        latency TEXT
+    );
+    CREATE INDEX chat_messages_user ON chat_messages (user_id, id);
+    """,
+]
+
+
+class Storage(abc.ABC):
+    """Backend interface. Days and dates are ISO `YYYY-MM-DD` strings.
+
+    Every method is abstract, so a backend missing one fails when it is
+    created rather than in the middle of a request.
+    """
+
+    @abc.abstractmethod
+    def load_profile(self, user_id):
+        """Returns the stored profile dict, or None for an unknown user."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save_profile(self, user_id, fields):
+        """Writes only the given profile fields."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_daily_log(self, user_id, day):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def increment_daily(self, user_id, day, field, amount):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_daily(self, user_id, day, field, value):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_task_done(self, user_id, day, task_id, done):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def append_history(self, user_id, row):
+        """Creates or updates the history row for `row['date']`.
+
+        Only the HISTORY_FIELDS present in `row` are written; others keep
+        their stored values.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_history(self, user_id, start=None, end=None):
+        """Returns history rows (date + HISTORY_FIELDS) with start <= date <= end, oldest first."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_history(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_history(self, user_id, start=None, end=None, batch_size=1000):
+        """Yields lists of history rows (oldest first), at most `batch_size` each."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def iter_daily_logs(self, user_id, start=None, end=None, batch_size=1000):
+        """Like `iter_history`, for daily logs; `completed_tasks` is a sorted list."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def bulk_append_history(self, user_id, rows):
+        """`append_history` for many (date, *HISTORY_FIELDS) rows at once.
+
+        A None value keeps the stored one, so a file with only some of the
+        columns doesn't blank out the others.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def bulk_set_daily(self, user_id, rows, completed_tasks=()):
+        """Sets daily logs from (day, protein, water, steps, soreness) rows
+        and marks (day, task_id) pairs in `completed_tasks` as done.
+
+        A None value keeps the stored one (zero for a new day), as in
+        `bulk_append_history`.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def list_users(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def last_rollover(self, user_id):
+        """The last day compacted into history, or None."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_last_rollover(self, user_id, day):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def pending_days(self, user_id, after=None, before=None):
+        """Days with a daily log or completed tasks, after < day < before, oldest first."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def save_rollups(self, user_id, period, rows):
+        """Replaces rollup rows (dicts with 'start' + ROLLUP_FIELDS) for `period`."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_rollups(self, user_id, period, start=None):
+        """Rollup rows of `period` ('week' or 'month') starting on/after `start`."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def archive_messages(self, user_id, messages):
+        """Appends chat messages (dicts with role, content and optional latency)."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def load_messages(self, user_id, before=None, limit=20):
+        """The newest `limit` archived messages with id < `before`, oldest first.
+
+        Each message carries its archive 'id' for paging further back.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_messages(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def clear_messages(self, user_id):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_user(self, user_id):
+        raise NotImplementedError
+
+
+class SQLiteStorage(Storage):
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+
+    def _migrate(self):
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for i, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+                self._conn.execute("BEGIN IMMEDIATE")
+                # Another worker may have migrated while we waited for the lock.
+                if self._conn.execute("PRAGMA user_version").fetchone()[0] >= i:
+                    self._conn.execute("ROLLBACK")
+                    continue
+                for statement in script.split(";"):
+                    if statement.strip():
+                        self._conn.execute(statement)
+                self._conn.execute(f"PRAGMA user_version = {i}")
+                self._conn.execute("COMMIT")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def load_profile(self, user_id):
+        rows = self._execute("SELECT field, value FROM profile_fields WHERE user_id = ?", (user_id,))
+        if not rows:
+            return None
+        return {r['field']: json.loads(r['value']) for r in rows}
+
+    def save_profile(self, user_id, fields):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO profile_fields (user_id, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id, field) DO UPDATE SET value = excluded.value",
+                [(user_id, k, json.dumps(v)) for k, v in fields.items()],
+            )
+
+    def load_daily_log(self, user_id, day):
+        rows = self._execute(
+            "SELECT protein, water, steps, soreness FROM daily_logs WHERE user_id = ? AND day = ?",
+            (user_id, day),
+        )
+        log = dict(rows[0]) if rows else {'protein': 0, 'water': 0.0, 'steps': 0, 'soreness': 0}
+        tasks = self._execute(
+            "SELECT task_id FROM completed_tasks WHERE user_id = ? AND day = ?", (user_id, day)
+        )
+        log['completed_tasks'] = {r['task_id'] for r in tasks}
+        return log
+
+    def increment_daily(self, user_id, day, field, amount):
+        self._check_daily_field(field)
+        self._execute(
+            f"INSERT INTO daily_logs (user_id, day, {field}) VALUES (?, ?, ?) "
+            f"ON CONFLICT(user_id, day) DO UPDATE SET {field} = {field} + excluded.{field}",
+            (user_id, day, amount),
+        )
+
+    def set_daily(self, user_id, day, field, value):
+        self._check_daily_field(field)
+        self._execute(
+            f"INSERT INTO daily_logs (user_id, day, {field}) VALUES (?, ?, ?) "
+            f"ON CONFLICT(user_id, day) DO UPDATE SET {field} = excluded.{field}",
+            (user_id, day, value),
+        )
+
+    def set_task_done(self, user_id, day, task_id, done):
+        if done:
+            sql = "INSERT OR IGNORE INTO completed_tasks (user_id, day, task_id) VALUES (?, ?, ?)"
+        else:
+            sql = "DELETE FROM completed_tasks WHERE user_id = ? AND day = ? AND task_id = ?"
+        self._execute(sql, (user_id, day, task_id))
+
+    def append_history(self, user_id, row):
+        fields = [f for f in HISTORY_FIELDS if f in row]
+        updates = ", ".join(f"{f} = excluded.{f}" for f in fields) or "date = excluded.date"
+        self._execute(
+            f"INSERT INTO history (user_id, date{''.join(', ' + f for f in fields)}) "
+            f"VALUES (?, ?{', ?' * len(fields)}) ON CONFLICT(user_id, date) DO UPDATE SET {updates}",
+            (user_id, row['date'], *(row[f] for f in fields)),
+        )
+
+    def load_history(self, user_id, start=None, end=None):
+        rows = self._execute(
+            f"SELECT date, {', '.join(HISTORY_FIELDS)} FROM history "
+            "WHERE user_id = ? AND date >= ? AND date <= ? ORDER BY date",
+            (user_id, start or '0000-00-00', end or '9999-99-99'),
+        )
+        return [dict(r) for r in rows]
+
+    def has_history(self, user_id):
+        return bool(self._execute("SELECT 1 FROM history WHERE user_id = ? LIMIT 1", (user_id,)))
+
+    def iter_history(self, user_id, start=None, end=None, batch_size=1000):
+        return self._iter_rows(
+            f"SELECT date, {', '.join(HISTORY_FIELDS)} FROM history WHERE user_id = ? AND date > ? AND date <= ? "
+            "ORDER BY date LIMIT ?",
+            'date', user_id, start, end, batch_size,
+        )
+
+    def iter_daily_logs(self, user_id, start=None, end=None, batch_size=1000):
+        sql = (
+            "SELECT d.day AS date, d.protein, d.water, d.steps, d.soreness, "
+            "(SELECT group_concat(task_id, ' ') FROM completed_tasks t WHERE t.user_id = d.user_id AND t.day = d.day) "
+            "AS completed_tasks FROM daily_logs d WHERE d.user_id = ? AND d.day > ? AND d.day <= ? "
+            "ORDER BY d.day LIMIT ?"
+        )
+        for batch in self._iter_rows(sql, 'date', user_id, start, end, batch_size):
+            for row in batch:
+                row['completed_tasks'] = sorted((row['completed_tasks'] or "").split())
+            yield batch
+
+    def _iter_rows(self, sql, date_column, user_id, start, end, batch_size):
+        # Keyset pagination: each batch is a short query, so the lock is never
+        # held while the caller processes rows.
+        after = _day_before(start) if start else '0000-00-00'
+        while True:
+            rows = [dict(r) for r in self._execute(sql, (user_id, after, end or '9999-99-99', batch_size))]
+            if not rows:
+                return
+            yield rows
+            after = rows[-1][date_column]
+
+    def bulk_append_history(self, user_id, rows):
+        updates = ", ".join(f"{f} = COALESCE(excluded.{f}, {f})" for f in HISTORY_FIELDS)
+        self._execute_batch(
+            f"INSERT INTO history (user_id, date, {', '.join(HISTORY_FIELDS)}) "
+            f"VALUES (?, ?{', ?' * len(HISTORY_FIELDS)}) ON CONFLICT(user_id, date) DO UPDATE SET {updates}",
+            [(user_id, *row) for row in rows],
+        )
+
+    def bulk_set_daily(self, user_id, rows, completed_tasks=()):
+        rows = list(rows)
+        updates = ", ".join(f"{f} = COALESCE(?, {f})" for f in DAILY_FIELDS)
+        self._execute_batch(
+            "INSERT OR IGNORE INTO daily_logs (user_id, day) VALUES (?, ?)",
+            [(user_id, row[0]) for row in rows],
+            f"UPDATE daily_logs SET {updates} WHERE user_id = ? AND day = ?",
+            [(*row[1:], user_id, row[0]) for row in rows],
+            "INSERT OR IGNORE INTO completed_tasks (user_id, day, task_id) VALUES (?, ?, ?)",
+            [(user_id, day, task_id) for day, task_id in completed_tasks],
+        )
+
+    def _execute_batch(self, *statements):
+        """Runs (sql, params) pairs with executemany, all in one transaction."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in zip(statements[::2], statements[1::2]):
+                    self._conn.executemany(sql, params)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def list_users(self):
+        rows = self._execute(
+            "SELECT user_id FROM profile_fields UNION SELECT user_id FROM daily_logs "
+            "UNION SELECT user_id FROM completed_tasks ORDER BY user_id"
+        )
+        return [r['user_id'] for r in rows]
+
+    def last_rollover(self, user_id):
+        rows = self._execute("SELECT last_day FROM rollover_state WHERE user_id = ?", (user_id,))
+        return rows[0]['last_day'] if rows else None
+
+    def set_last_rollover(self, user_id, day):
+        self._execute(
+            "INSERT INTO rollover_state (user_id, last_day) VALUES (?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET last_day = excluded.last_day",
+            (user_id, day),
+        )
+
+    def pending_days(self, user_id, after=None, before=None):
+        bounds = (user_id, after or '0000-00-00', before or '9999-99-99')
+        rows = self._execute(
+            "SELECT day FROM daily_logs WHERE user_id = ? AND day > ? AND day < ? "
+            "UNION SELECT day FROM completed_tasks WHERE user_id = ? AND day > ? AND day < ? ORDER BY day",
+            bounds * 2,
+        )
+        return [r['day'] for r in rows]
+
+    def save_rollups(self, user_id, period, rows):
+        columns = ('start',) + ROLLUP_FIELDS
+        self._execute_batch(
+            f"INSERT OR REPLACE INTO rollups (user_id, period, {', '.join(columns)}) "
+            f"VALUES (?, ?{', ?' * len(columns)})",
+            [(user_id, period, *(row.get(c) for c in columns)) for row in rows],
+        )
+
+    def load_rollups(self, user_id, period, start=None):
+        rows = self._execute(
+            f"SELECT start, {', '.join(ROLLUP_FIELDS)} FROM rollups "
+            "WHERE user_id = ? AND period = ? AND start >= ? ORDER BY start",
+            (user_id, period, start or '0000-00-00'),
+        )
+        return [dict(r) for r in rows]
+
+    def archive_messages(self, user_id, messages):
+        self._execute_batch(
+            "INSERT INTO chat_messages (user_id, role, content, latency) VALUES (?, ?, ?, ?)",
+            [
+                (user_id, m['role'], m['content'], json.dumps(m['latency']) if m.get('latency') else None)
+                for m in messages
+            ],
+        )
+
+    def load_messages(self, user_id, before=None, limit=20):
+        rows = self._execute(
+            "SELECT id, role, content, latency FROM chat_messages "
+            "WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (user_id, before if before is not None else 2 ** 63 - 1, limit),
+        )
+        messages = []
+        for r in reversed(rows):
+            message = {'id': r['id'], 'role': r['role'], 'content': r['content']}
+            if r['latency']:
+                message['latency'] = json.loads(r['latency'])
+            messages.append(message)
+        return messages
+
+    def count_messages(self, user_id):
+        return self._execute("SELECT COUNT(*) AS n FROM chat_messages WHERE user_id = ?", (user_id,))[0]['n']
+
+    def clear_messages(self, user_id):
+        self._execute("DELETE FROM chat_messages WHERE user_id = ?", (user_id,))
+
+    def delete_user(self, user_id):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for table in ('profile_fields', 'daily_logs', 'completed_tasks', 'history', 'rollover_state', 'rollups',
+                          'chat_messages'):
+                self._conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _check_daily_field(field):
+        if field not in DAILY_FIELDS:
+            raise ValueError(f"Unknown daily log field: {field}")
+
+
+def _day_before(day):
+    return (datetime.date.fromisoformat(day) - datetime.timedelta(days=1)).isoformat()
+
+
+BACKENDS = {'sqlite': SQLiteStorage}
+
+
+def open_storage(url):
+    """Opens a backend from a URL such as `sqlite:///.data/fitcoach.sqlite`."""
+    scheme, sep, location = url.partition("://")
+    if not sep or scheme not in BACKENDS:
+        raise ValueError(f"Unsupported storage URL: {url}")
+    # sqlite:///relative/path -> 'relative/path'; sqlite:////abs/path -> '/abs/path'
+    return BACKENDS[scheme](location[1:] if location.startswith("/") else location)
@@ -0,0 +1,165 @@
+"""Script-run and section instrumentation.
+
+Every script run is timed, optionally split into named sections (sidebar,
+task list, cards, charts, ...). When a run ends it is logged as one JSON line
+on the `fitcoach.timing` logger and folded into process-wide statistics that
+`report()` returns. The first completed run in a process is flagged as the
+cold start.
+
+Runs are grouped into interactions: a run that starts because the previous one
+called `st.rerun()` (see `RunTimer.finish(status='rerun')`) belongs to the same
+interaction, so the log shows how many full-script executions one click cost.
+"""
+import collections
+import contextlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger("fitcoach.timing")
+
+SAMPLE_WINDOW = 200
+_SESSION_KEY = '_timing'
+
+_PROCESS_STARTED = time.perf_counter()
+_lock = threading.Lock()
+_cold_start = None
+_pages = {}
+_sections = {}
+_reruns_per_interaction = collections.deque(maxlen=SAMPLE_WINDOW)
+_log_files = set()
+
+
+def percentile(ordered, q):
+    """Nearest-rank `q` quantile (0..1) of an ascending sequence; 0.0 when empty."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class _Stats:
+    __slots__ = ('count', 'total_ms', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.samples = collections.deque(maxlen=SAMPLE_WINDOW)
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.samples.append(ms)
+
+    def summary(self):
+        p95 = percentile(sorted(self.samples), 0.95)
+        return {
+            'runs': self.count,
+            'mean_ms': round(self.total_ms / self.count, 2) if self.count else 0.0,
+            'p95_ms': round(p95, 2),
+            'max_ms': round(self.max_ms, 2),
+        }
+
+
+def log_to_file(path):
+    """Also writes timing records to `path` (JSON lines). Safe to call every rerun."""
+    with _lock:
+        if path in _log_files:
+            return
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        _log_files.add(path)
+
+
+class RunTimer:
+    """Times one script run, split into named sections.
+
+    `session` is the per-browser state mapping (st.session_state); it carries
+    the interaction counters between runs.
+    """
+
+    def __init__(self, start=None, page=None, session=None):
+        self.start = start if start is not None else time.perf_counter()
+        self.page = page
+        self.sections = {}
+        self.finished = False
+        self._session = session if session is not None else {}
+        state = self._session.setdefault(_SESSION_KEY, {'interaction': 0, 'runs': 0, 'continued': False, 'recent': []})
+        if state['continued']:
+            state['runs'] += 1
+        else:
+            if state['runs']:
+                with _lock:
+                    _reruns_per_interaction.append(state['runs'])
+            state['interaction'] += 1
+            state['runs'] = 1
+        state['continued'] = False
+        self._state = state
+
+    @contextlib.contextmanager
+    def section(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections[name] = self.sections.get(name, 0.0) + time.perf_counter() - started
+
+    def finish(self, status='complete'):
+        """Records the run and returns its log record.
+
+        Pass status='rerun' right before `st.rerun()`: the run is recorded as
+        cut short and the next run is counted towards the same interaction.
+        """
+        global _cold_start
+        if self.finished:
+            return None
+        self.finished = True
+        total_ms = (time.perf_counter() - self.start) * 1000
+        sections_ms = {k: round(v * 1000, 2) for k, v in self.sections.items()}
+        with _lock:
+            cold = _cold_start is None and status == 'complete'
+            if cold:
+                _cold_start = {'page': self.page, 'run_ms': round(total_ms, 2)}
+            _pages.setdefault(self.page, _Stats()).add(total_ms)
+            for name, ms in sections_ms.items():
+                _sections.setdefault(name, _Stats()).add(ms)
+        self._state['continued'] = status == 'rerun'
+        record = {
+            'event': 'script_run',
+            'ts': round(time.time(), 3),
+            'page': self.page,
+            'status': status,
+            'cold': cold,
+            'interaction': self._state['interaction'],
+            'run_in_interaction': self._state['runs'],
+            'total_ms': round(total_ms, 2),
+            'sections_ms': sections_ms,
+        }
+        self._state['recent'] = (self._state['recent'] + [record])[-20:]
+        logger.info(json.dumps(record))
+        return record
+
+
+def session_runs(session):
+    """The most recent run records of one session, oldest first."""
+    return list(session.get(_SESSION_KEY, {}).get('recent', []))
+
+
+def report():
+    with _lock:
+        reruns = sorted(_reruns_per_interaction)
+        return {
+            'cold_start': _cold_start,
+            'uptime_s': round(time.perf_counter() - _PROCESS_STARTED, 1),
+            'pages': {page: s.summary() for page, s in _pages.items()},
+            'sections': {name: s.summary() for name, s in _sections.items()},
+            'runs_per_interaction': {
+                'interactions': len(reruns),
+                'mean': round(sum(reruns) / len(reruns), 2) if reruns else 0.0,
+                'max': reruns[-1] if reruns else 0,
+            },
+        }
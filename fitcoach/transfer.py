@@ -0,0 +1,197 @@
+"""Streaming import/export of history and daily logs.
+
+Formats: NDJSON, CSV and Parquet. Exports page through storage in batches
+and write each batch straight to a spooled temporary file (kept in memory
+while small, moved to disk when large), so a multi-year export never holds
+more than one batch in memory. Imports read the file in batches as well,
+validate each batch column-wise with pandas and write it with one bulk
+storage call.
+
+Column names from other trackers are mapped through ALIASES ("Day",
+"weight_kg", "Step Count", ...). Rows with an unparsable or future date, or
+with a value outside LIMITS, are rejected and reported; the rest are imported.
+pandas (and pyarrow for Parquet) are imported on first use.
+"""
+import datetime
+import json
+import re
+import tempfile
+
+from fitcoach.storage import HISTORY_FIELDS
+
+FORMATS = {
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'csv': ('csv', 'text/csv'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+COLUMNS = {
+    'history': ('date',) + HISTORY_FIELDS,
+    'daily': ('date', 'protein', 'water', 'steps', 'soreness', 'completed_tasks'),
+}
+# Accepted (min, max) per numeric column.
+LIMITS = {
+    'weight': (20, 400),
+    'tasks': (0, 100),
+    'protein': (0, 1000),
+    'water': (0, 20),
+    'steps': (0, 200_000),
+    'soreness': (0, 10),
+    'completion': (0, 1),
+}
+INTEGER_COLUMNS = {'tasks', 'protein', 'steps', 'soreness'}
+ALIASES = {
+    'day': 'date', 'timestamp': 'date', 'logged_at': 'date',
+    'weight_kg': 'weight', 'body_weight': 'weight', 'bodyweight': 'weight',
+    'tasks_completed': 'tasks', 'completed': 'tasks',
+    'protein_g': 'protein', 'water_l': 'water', 'water_liters': 'water',
+    'step_count': 'steps', 'tasks_done': 'completed_tasks',
+}
+BATCH_SIZE = 5000
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+MAX_REPORTED_ERRORS = 10
+
+_UNITS_RE = re.compile(r"\s*\(.*?\)")
+
+
+def file_name(kind, fmt, user_id):
+    return f"fitcoach_{user_id}_{kind}.{FORMATS[fmt][0]}"
+
+
+def export_file(storage, user_id, kind, fmt, start=None, end=None, batch_size=BATCH_SIZE):
+    """Writes the export to a spooled temporary file and returns it rewound."""
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    write_export(out, storage, user_id, kind, fmt, start, end, batch_size)
+    out.seek(0)
+    return out
+
+
+def write_export(out, storage, user_id, kind, fmt, start=None, end=None, batch_size=BATCH_SIZE):
+    """Streams `kind` rows ('history' or 'daily') to the binary file `out`. Returns the row count."""
+    batches = storage.iter_history if kind == 'history' else storage.iter_daily_logs
+    columns = COLUMNS[kind]
+    count = 0
+    writer = None
+    for batch in batches(user_id, start, end, batch_size):
+        count += len(batch)
+        if kind == 'daily':
+            batch = [{**row, 'completed_tasks': " ".join(row['completed_tasks'])} for row in batch]
+        if fmt == 'ndjson':
+            out.write("".join(json.dumps(row) + "\n" for row in batch).encode("utf-8"))
+        elif fmt == 'csv':
+            import pandas as pd
+            pd.DataFrame(batch, columns=columns).to_csv(out, header=count == len(batch), index=False)
+        elif fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pylist(batch, schema=_arrow_schema(kind))
+            writer = writer or pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        else:
+            raise ValueError(f"Unsupported export format: {fmt}")
+    if fmt == 'csv' and not count:
+        out.write((",".join(columns) + "\n").encode("utf-8"))
+    if fmt == 'parquet':
+        if writer is None:
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(out, _arrow_schema(kind))
+        writer.close()
+    return count
+
+
+def _arrow_schema(kind):
+    import pyarrow as pa
+    types = {
+        'date': pa.string(), 'weight': pa.float64(), 'water': pa.float64(), 'completion': pa.float64(),
+        'completed_tasks': pa.string(),
+    }
+    return pa.schema([(name, types.get(name, pa.int64())) for name in COLUMNS[kind]])
+
+
+def import_file(storage, user_id, file, kind, fmt, batch_size=BATCH_SIZE, today=None):
+    """Bulk-loads a file into storage.
+
+    Returns {'imported', 'rejected', 'errors', 'days'}; 'days' are the
+    imported ISO dates, ascending.
+    """
+    today = today or datetime.date.today()
+    result = {'imported': 0, 'rejected': 0, 'errors': []}
+    days = set()
+    offset = 0
+    for frame in _read_batches(file, fmt, batch_size):
+        rows, errors = validate(frame, kind, today, offset)
+        offset += len(frame)
+        result['rejected'] += len(frame) - len(rows)
+        result['errors'] = (result['errors'] + errors)[:MAX_REPORTED_ERRORS]
+        if rows.empty:
+            continue
+        if kind == 'history':
+            storage.bulk_append_history(user_id, rows.itertuples(index=False, name=None))
+        else:
+            tasks = [(day, task) for day, ids in zip(rows['date'], rows.pop('completed_tasks')) for task in ids]
+            storage.bulk_set_daily(user_id, rows.itertuples(index=False, name=None), tasks)
+        result['imported'] += len(rows)
+        days.update(rows['date'])
+    result['days'] = sorted(days)
+    return result
+
+
+def _read_batches(file, fmt, batch_size):
+    import pandas as pd
+    if fmt == 'csv':
+        yield from pd.read_csv(file, chunksize=batch_size, dtype=str)
+    elif fmt == 'ndjson':
+        yield from pd.read_json(
+            file, lines=True, chunksize=batch_size, dtype=False, convert_dates=False, precise_float=True
+        )
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(file).iter_batches(batch_size=batch_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def validate(frame, kind, today, offset=0):
+    """Vectorized checks for one batch.
+
+    Returns (rows, errors): a DataFrame with the columns of COLUMNS[kind] in
+    storage types, one row per valid date (the last one wins), and messages
+    for the first few rejected rows, numbered from `offset + 1`.
+    """
+    import pandas as pd
+    frame = frame.rename(columns=lambda c: _canonical(str(c)))
+    if 'date' not in frame:
+        raise ValueError("The file has no date column.")
+    # Timestamps with an offset ("...Z", "+05:30", mixed) become UTC calendar days;
+    # plain dates stay as they are.
+    dates = pd.to_datetime(frame['date'].astype(str), errors='coerce', format='mixed', utc=True)
+    dates = dates.dt.tz_localize(None).dt.normalize()
+    problems = {'date': dates.isna() | (dates > pd.Timestamp(today))}
+    out = pd.DataFrame({'date': dates.dt.strftime('%Y-%m-%d')}, index=frame.index)
+    for column in COLUMNS[kind][1:]:
+        if column == 'completed_tasks':
+            raw = frame[column] if column in frame else pd.Series("", index=frame.index)
+            out[column] = raw.fillna("").astype(str).str.split()
+            continue
+        raw = frame[column] if column in frame else pd.Series(None, index=frame.index, dtype=object)
+        values = pd.to_numeric(raw, errors='coerce')
+        low, high = LIMITS[column]
+        problems[column] = raw.notna() & (values.isna() | ~values.between(low, high))
+        if column in INTEGER_COLUMNS:
+            values = values.round().astype('Int64')
+        # Plain Python values with None for missing: what sqlite3 can bind.
+        out[column] = values.astype(object).where(values.notna(), None)
+    bad = pd.concat(problems, axis=1)
+    rejected = bad.any(axis=1)
+    errors = [
+        f"Row {offset + i + 1}: invalid {', '.join(bad.columns[bad.iloc[i]])}"
+        for i in (rejected.to_numpy().nonzero()[0][:MAX_REPORTED_ERRORS])
+    ]
+    rows = out[~rejected].drop_duplicates('date', keep='last').reset_index(drop=True)
+    return rows, errors
+
+
+def _canonical(name):
+    # 'Weight (kg)' -> 'weight', 'Step Count' -> 'step_count' -> 'steps'
+    name = _UNITS_RE.sub("", name).strip().lower().replace(" ", "_").replace("-", "_")
+    return ALIASES.get(name, name)
@@ -1,172 +1,225 @@
+import time
+_run_started = time.perf_counter()
+
 import streamlit as st
+import contextlib
 import datetime
 import os
 import json
 import random
-import pandas as pd
+import re
+import uuid
+import zoneinfo
+
+from fitcoach import catalog, persona, planner, render, rollover, router, session_memory, timing
+from fitcoach.constants import (
+    CUSTOM_CSS, DEFAULT_PROFILE, DIET_GUIDELINES, WEEKLY_SPLIT
+)
+from fitcoach.coach_workers import CANCELLED, DONE, QUEUED, REJECTED, THROTTLED, TIMEOUT, CoachWorkerPool
+from fitcoach.rate_limit import RateLimiter
+from fitcoach.context_window import ConversationWindow, extractive_summary
+from fitcoach.exercise_index import ExerciseIndex, paginate
+from fitcoach.response_cache import ResponseCache, make_key
+from fitcoach.storage import open_storage
+
+run_timer = timing.RunTimer(start=_run_started, session=st.session_state)
+if os.environ.get("COACH_TIMING_LOG"):
+    timing.log_to_file(os.environ["COACH_TIMING_LOG"])
+
+def rerun():
+    """st.rerun() that first records the cut-short run (see fitcoach.timing)."""
+    run_timer.finish(status='rerun')
+    st.rerun()
 
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
-    page_title="GAURAV FIT COACH — Pro",
+    page_title="FIT COACH — Pro",
     page_icon="🏋️",
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
 # --- CUSTOM CSS ---
-st.markdown("""
-<style>
-    .stChatInput { border-radius: 12px; }
-    .stChatMessage { border-radius: 12px; padding: 1rem; }
-    h1, h2, h3 { color: #4f46e5; }
-    .card {
-        background-color: white;
-        padding: 1.5rem;
-        border-radius: 0.75rem;
-        border: 1px solid #e5e7eb;
-        box-shadow: 0 1px 2px 0 rgba(0, 0, 0, 0.05);
-        margin-bottom: 1rem;
-    }
-    .metric-container {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 10px;
-        background-color: #f8fafc;
-        border-radius: 8px;
-        margin-bottom: 5px;
-    }
-    .stProgress > div > div > div > div { background-color: #4f46e5; }
-    button[kind="secondary"] {
-        background-color: #f1f5f9;
-        color: #475569;
-        border: none;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-# --- DEPENDENCY CHECK ---
-try:
-    from google import genai
-    from google.genai import types
-except ImportError:
-    st.error("""
-    **Missing Dependencies**
-    
-    Please install the required library:
-    ```bash
-    pip install google-genai
-    ```
-    """)
-    st.stop()
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
-# --- CONSTANTS & DATA (Ported from TypeScript) ---
+# --- STATE MANAGEMENT ---
+@st.cache_resource(show_spinner=False)
+def get_storage():
+    """Process-wide storage backend (SQLite unless COACH_STORAGE_URL says otherwise)."""
+    return open_storage(os.environ.get("COACH_STORAGE_URL", "sqlite:///.data/fitcoach.sqlite"))
 
-EXERCISE_DATABASE = {
-    # --- IMPACT / BONE DENSITY ---
-    'jump-rope': { 'name': 'Jump Rope / Pogo Hops', 'group': 'Cardio', 'desc': '3 sets x 1 min', 'video': 'https://www.youtube.com/results?search_query=how+to+jump+rope+properly', 'mode': ['Home', 'Gym'], 'pattern': 'Gait' },
-    'box-jumps': { 'name': 'Box Jumps', 'group': 'Legs', 'desc': '3 sets x 8 reps', 'video': 'https://www.youtube.com/results?search_query=box+jump+technique', 'mode': ['Gym'], 'pattern': 'Squat' },
-    'broad-jumps': { 'name': 'Broad Jumps', 'group': 'Legs', 'desc': '3 sets x 6 reps', 'video': 'https://www.youtube.com/results?search_query=standing+broad+jump+form', 'mode': ['Home', 'Gym'], 'pattern': 'Hinge' },
-    'lateral-skater-jumps': { 'name': 'Lateral Skater Jumps', 'group': 'Cardio', 'desc': '3 sets x 30s', 'video': 'https://www.youtube.com/results?search_query=skater+jumps+exercise', 'mode': ['Home', 'Gym'], 'pattern': 'Impact' },
-    'med-ball-slam': { 'name': 'Medicine Ball Slams', 'group': 'Power', 'desc': '3 sets x 10 reps', 'video': 'https://www.youtube.com/results?search_query=medicine+ball+slams', 'mode': ['Gym'], 'pattern': 'Power' },
-    'heel-drops': { 'name': 'Heel Drops', 'group': 'Bone Density', 'desc': '3 sets x 20 reps', 'video': 'https://www.youtube.com/results?search_query=heel+drops+for+osteoporosis', 'mode': ['Home', 'Gym'], 'pattern': 'Impact' },
-    
-    # --- AXIAL LOADING (Spine Compression) ---
-    'trap-bar-deadlift': { 'name': 'Trap Bar Deadlift', 'group': 'Legs/Back', 'desc': '3 sets x 6-8 reps', 'video': 'https://www.youtube.com/results?search_query=trap+bar+deadlift+form', 'mode': ['Gym'], 'pattern': 'Hinge' },
-    'front-squat': { 'name': 'Front Squat', 'group': 'Legs', 'desc': '3 sets x 8 reps', 'video': 'https://www.youtube.com/results?search_query=front+squat+form', 'mode': ['Gym'], 'pattern': 'Squat' },
-    'zercher-squat': { 'name': 'Zercher Squat', 'group': 'Legs/Core', 'desc': '3 sets x 8 reps', 'video': 'https://www.youtube.com/results?search_query=zercher+squat+form', 'mode': ['Gym'], 'pattern': 'Squat' },
-    'weighted-step-ups': { 'name': 'Weighted Step-Ups', 'group': 'Legs', 'desc': '3 sets x 10/leg', 'video': 'https://www.youtube.com/results?search_query=weighted+step+up+form', 'mode': ['Home', 'Gym'], 'pattern': 'Lunge' },
-    'rucking': { 'name': 'Rucking (Weighted Walk)', 'group': 'Back/Legs', 'desc': '20-30 min walk', 'video': 'https://www.youtube.com/results?search_query=how+to+ruck+properly', 'mode': ['Home', 'Gym'], 'pattern': 'Gait' },
-
-    # --- PUSH ---
-    'pushups': { 'name': 'Standard Push-Up', 'group': 'Chest', 'desc': '3 sets x 15 reps', 'video': 'https://www.youtube.com/results?search_query=perfect+pushup+form', 'mode': ['Home'], 'pattern': 'Push' },
-    'pike-pushups': { 'name': 'Pike Push-Up', 'group': 'Shoulders', 'desc': '3 sets x 10 reps', 'video': 'https://www.youtube.com/results?search_query=pike+pushup+progression', 'mode': ['Home'], 'pattern': 'Push' },
-    'chair-dips': { 'name': 'Tricep Chair Dips', 'group': 'Triceps', 'desc': '3 sets x 15 reps', 'video': 'https://www.youtube.com/results?search_query=how+to+do+chair+dips', 'mode': ['Home'], 'pattern': 'Push' },
-    'bench-press': { 'name': 'Barbell Bench Press', 'group': 'Chest', 'desc': '3 sets x 8-10 reps', 'video': 'https://www.youtube.com/results?search_query=bench+press+form', 'mode': ['Gym'], 'pattern': 'Push' },
-    'overhead-press': { 'name': 'Overhead Press', 'group': 'Shoulders', 'desc': '3 sets x 10 reps', 'video': 'https://www.youtube.com/results?search_query=overhead+press+form', 'mode': ['Gym', 'Home'], 'pattern': 'Push' },
-    'landmine-press': { 'name': 'Landmine Press', 'group': 'Shoulders', 'desc': '3 sets x 10/arm', 'video': 'https://www.youtube.com/results?search_query=landmine+press+form', 'mode': ['Gym'], 'pattern': 'Push' },
-
-    # --- PULL ---
-    'pullups': { 'name': 'Pull-Ups', 'group': 'Back', 'desc': '3 sets x Max reps', 'video': 'https://www.youtube.com/results?search_query=how+to+do+pullups', 'mode': ['Home', 'Gym'], 'pattern': 'Pull' },
-    'dumbbell-row': { 'name': 'Dumbbell Row', 'group': 'Back', 'desc': '3 sets x 12 reps', 'video': 'https://www.youtube.com/results?search_query=dumbbell+row+form', 'mode': ['Home', 'Gym'], 'pattern': 'Pull' },
-    'lat-pulldown': { 'name': 'Lat Pulldown', 'group': 'Back', 'desc': '3 sets x 12 reps', 'video': 'https://www.youtube.com/results?search_query=lat+pulldown+form', 'mode': ['Gym'], 'pattern': 'Pull' },
-    'cable-row': { 'name': 'Seated Cable Row', 'group': 'Back', 'desc': '3 sets x 12 reps', 'video': 'https://www.youtube.com/results?search_query=seated+cable+row+form', 'mode': ['Gym'], 'pattern': 'Pull' },
-    'face-pulls': { 'name': 'Face Pulls', 'group': 'Shoulders', 'desc': '3 sets x 15 reps', 'video': 'https://www.youtube.com/results?search_query=face+pull+exercise', 'mode': ['Gym', 'Home'], 'pattern': 'Pull' },
-
-    # --- LEGS (Squat/Lunge) ---
-    'goblet-squat': { 'name': 'Goblet Squat', 'group': 'Legs', 'desc': '4 sets x 12 reps', 'video': 'https://www.youtube.com/results?search_query=goblet+squat+form', 'mode': ['Home', 'Gym'], 'pattern': 'Squat' },
-    'bulgarian-split-squat': { 'name': 'Bulgarian Split Squat', 'group': 'Legs', 'desc': '3 sets x 8/leg', 'video': 'https://www.youtube.com/results?search_query=bulgarian+split+squat+form', 'mode': ['Home', 'Gym'], 'pattern': 'Lunge' },
-    'walking-lunges': { 'name': 'Walking Lunges', 'group': 'Legs', 'desc': '3 sets x 20 steps', 'video': 'https://www.youtube.com/results?search_query=walking+lunges+form', 'mode': ['Home', 'Gym'], 'pattern': 'Lunge' },
-    
-    # --- HINGE / HAMSTRINGS ---
-    'rdl': { 'name': 'Romanian Deadlift', 'group': 'Legs', 'desc': '3 sets x 10 reps', 'video': 'https://www.youtube.com/results?search_query=rdl+form', 'mode': ['Home', 'Gym'], 'pattern': 'Hinge' },
-    'single-leg-rdl': { 'name': 'Single Leg RDL', 'group': 'Hamstrings', 'desc': '3 sets x 8/leg', 'video': 'https://www.youtube.com/results?search_query=single+leg+rdl+form', 'mode': ['Home', 'Gym'], 'pattern': 'Hinge' },
-    'kettlebell-swing': { 'name': 'Kettlebell Swing', 'group': 'Hinge', 'desc': '3 sets x 15 reps', 'video': 'https://www.youtube.com/results?search_query=kettlebell+swing+form', 'mode': ['Home', 'Gym'], 'pattern': 'Hinge' },
-
-    # --- CORE / CARRY ---
-    'plank': { 'name': 'Plank', 'group': 'Core', 'desc': '3 sets x 60s', 'video': 'https://www.youtube.com/results?search_query=perfect+plank+form', 'mode': ['Home', 'Gym'], 'pattern': 'Core' },
-    'dead-bug': { 'name': 'Dead Bug', 'group': 'Core', 'desc': '3 sets x 12 reps', 'video': 'https://www.youtube.com/results?search_query=dead+bug+exercise', 'mode': ['Home', 'Gym'], 'pattern': 'Core' },
-    'farmer-carry': { 'name': 'Farmer Carry', 'group': 'Core/Grip', 'desc': '3 sets x 45s', 'video': 'https://www.youtube.com/results?search_query=farmer+carry+form', 'mode': ['Home', 'Gym'], 'pattern': 'Gait' },
-    'suitcase-carry': { 'name': 'Suitcase Carry', 'group': 'Core', 'desc': '3 sets x 30s/side', 'video': 'https://www.youtube.com/results?search_query=suitcase+carry+form', 'mode': ['Home', 'Gym'], 'pattern': 'Gait' },
-    
-    # --- SPECIALIZED ---
-    'cat-cow': { 'name': 'Cat-Cow Stretch', 'group': 'Mobility', 'desc': '1 min flow', 'video': 'https://www.youtube.com/results?search_query=cat+cow+stretch', 'mode': ['Home', 'Gym'], 'pattern': 'Mobility' },
-    'kegel-basic': { 'name': 'Kegel Hold', 'group': 'Pelvic Floor', 'desc': '3 sets x 10 reps (3s hold)', 'video': 'https://www.youtube.com/results?search_query=kegel+exercises+for+men', 'mode': ['Home'], 'pattern': 'Isolation' },
-    'chin-tuck': { 'name': 'Chin Tucks', 'group': 'Posture', 'desc': '20 reps', 'video': 'https://www.youtube.com/results?search_query=chin+tucks+for+posture', 'mode': ['Home'], 'pattern': 'Mobility' },
-    'tibialis-raise': { 'name': 'Tibialis Raise', 'group': 'Legs', 'desc': '3 sets x 20 reps', 'video': 'https://www.youtube.com/results?search_query=tibialis+raise+at+home', 'mode': ['Home', 'Gym'], 'pattern': 'Isolation' }
-}
-
-MEAL_TEMPLATES = {
-    'Non-veg': {
-        'Breakfast': {'name': "Eggs & Toast", 'cals': 500, 'pro': 25, 'ingredients': ["3 Eggs", "2 Brown Bread", "Butter"]},
-        'Lunch': {'name': "Chicken Curry & Rice", 'cals': 700, 'pro': 40, 'ingredients': ["Chicken Breast 150g", "Rice 1 cup", "Veg Salad"]},
-        'Snack': {'name': "Protein Shake & Fruit", 'cals': 250, 'pro': 25, 'ingredients': ["Whey Scoop", "Apple"]},
-        'Dinner': {'name': "Fish/Chicken & Veggies", 'cals': 500, 'pro': 35, 'ingredients': ["Fish/Chicken 150g", "Mixed Veggies", "1 Roti"]}
-    },
-    'Veg': {
-        'Breakfast': {'name': "Paneer Sandwich / Sprouts", 'cals': 450, 'pro': 20, 'ingredients': ["Paneer 100g", "Bread", "Sprouts"]},
-        'Lunch': {'name': "Dal, Paneer & Rice", 'cals': 700, 'pro': 25, 'ingredients': ["Dal 1 bowl", "Paneer 100g", "Rice"]},
-        'Snack': {'name': "Greek Yogurt / Whey", 'cals': 250, 'pro': 25, 'ingredients': ["Yogurt/Whey", "Berries"]},
-        'Dinner': {'name': "Soya Chunks Stir Fry", 'cals': 450, 'pro': 30, 'ingredients': ["Soya Chunks 50g", "Veggies", "Olive Oil"]}
-    }
-}
+@st.cache_resource(show_spinner=False)
+def get_rollover_scheduler():
+    """Background job that compacts finished days into history and rollups."""
+    interval = float(os.environ.get("COACH_ROLLOVER_INTERVAL_SECONDS", 60))
+    return rollover.RolloverScheduler(get_storage(), interval=interval).start()
 
-WEEKLY_SPLIT = {
-  "Monday": "Upper Body Strength (Push Focus) + Bone Loading",
-  "Tuesday": "Lower Body (Squat/Lunge) + Tibialis Work",
-  "Wednesday": "Active Recovery (Yoga + Core + Mobility)",
-  "Thursday": "Upper Body Strength (Pull Focus) + Posture",
-  "Friday": "Full Body Functional + High Impact (Bone density)",
-  "Saturday": "Cardio Zone 2 + Deep Stretch",
-  "Sunday": "Rest + Meal Prep + Mental Reset",
-}
+storage = get_storage()
+scheduler = get_rollover_scheduler()
 
-DIET_GUIDELINES = {'calories': 2300, 'protein': 120, 'water': 3.5, 'steps': 9000}
+# Multi-user mode (COACH_MULTI_USER=1) takes the user from a header set by an
+# authenticating proxy (COACH_USER_HEADER). COACH_MULTI_USER=demo signs people
+# in by name instead, which is not authentication: demos only.
+# Session memory limits: older chat messages are archived to storage and long
+# history ranges are read per render instead of being kept in the session.
+MULTI_USER = os.environ.get("COACH_MULTI_USER", "")
+USER_HEADER = os.environ.get("COACH_USER_HEADER")
+DEMO_SIGN_IN = MULTI_USER == "demo" and not USER_HEADER
+DEMO_DATA = bool(os.environ.get("COACH_DEMO_DATA"))
+MAX_SESSION_MESSAGES = int(os.environ.get("COACH_SESSION_MAX_MESSAGES", 40))
+MAX_SESSION_HISTORY_DAYS = int(os.environ.get("COACH_SESSION_MAX_HISTORY_DAYS", 400))
+ARCHIVE_PAGE = 20
+
+def user_slug(name):
+    return re.sub(r"[^a-z0-9_-]+", "-", name.strip().lower()).strip("-")[:40]
+
+def resolve_user_id():
+    """The signed-in user id, or None when nobody is signed in.
+
+    With COACH_USER_HEADER the id is that header's value and nothing else
+    (?user= is ignored). In demo sign-in it is ?user=; single-user
+    deployments use "default" unless ?user= says otherwise.
+    """
+    if USER_HEADER:
+        return (st.context.headers.get(USER_HEADER) or "").strip()[:200] or None
+    user = user_slug(st.query_params.get("user", ""))
+    if DEMO_SIGN_IN:
+        return user or None
+    if MULTI_USER:
+        return None  # no auth source configured; nobody gets in
+    return user or "default"
+
+def sign_in_form():
+    """Demo-only sign-in by name. A name's account belongs to whoever chose that exact name first."""
+    st.warning(
+        "Demo sign-in: there is no password, so anyone who enters the same name opens the same account. "
+        "Real deployments set COACH_USER_HEADER behind an authenticating proxy."
+    )
+    with st.form("sign_in"):
+        display_name = st.text_input("Your name").strip()
+        if st.form_submit_button("Start") and user_slug(display_name):
+            existing = storage.load_profile(user_slug(display_name))
+            if existing is not None and existing.get('sign_in_name', existing.get('name')) != display_name:
+                st.error("That name is already taken. Please pick another one.")
+                return
+            st.session_state.new_user_name = display_name
+            st.query_params["user"] = user_slug(display_name)
+            rerun()
+
+user_id = resolve_user_id()
+if user_id is None:
+    st.title("🏋️ Fit Coach")
+    if DEMO_SIGN_IN:
+        sign_in_form()
+    elif USER_HEADER:
+        st.error("You are not signed in. Open the app through your organization's sign-in page.")
+    else:
+        st.error("Multi-user mode needs COACH_USER_HEADER (set by an authenticating proxy), "
+                 "or COACH_MULTI_USER=demo for an unauthenticated demo.")
+    run_timer.finish()
+    st.stop()
+
+if st.session_state.get('user_id') != user_id:
+    # Signed in as someone else in this browser session: drop the previous user's state.
+    new_user_name = st.session_state.pop('new_user_name', None)
+    session_memory.forget(st.session_state.get('_session_id'))
+    # Underscore keys (timing, session id) belong to the browser session, not the user.
+    for key in [k for k in st.session_state.keys() if not k.startswith('_')]:
+        del st.session_state[key]
+    st.session_state.user_id = user_id
+    if new_user_name:
+        st.session_state.new_user_name = new_user_name
 
-# --- STATE MANAGEMENT ---
 if 'user_profile' not in st.session_state:
-    st.session_state.user_profile = {
-        'name': 'Gaurav', 'weight': 60.0, 'height': "5'7\"", 'diet': 'Non-veg', 
-        'workout_mode': 'Home', 'level': 'Intermediate', 'injuries': [], 'kegel_level': 1
-    }
+    profile = storage.load_profile(user_id)
+    if profile is None:
+        sign_in_name = st.session_state.pop('new_user_name', None)
+        profile = {**DEFAULT_PROFILE, 'name': sign_in_name or DEFAULT_PROFILE['name']}
+        if sign_in_name:
+            profile['sign_in_name'] = sign_in_name
+        storage.save_profile(user_id, profile)
+    st.session_state.user_profile = {**DEFAULT_PROFILE, **profile}
+
+# The log day follows the user's own midnight; the scheduler compacts the old one.
+today_iso = rollover.local_today(st.session_state.user_profile.get('timezone')).isoformat()
+if st.session_state.get('log_day') != today_iso:
+    st.session_state.log_day = today_iso
+    st.session_state.daily_log = storage.load_daily_log(user_id, st.session_state.log_day)
+
+def local_date():
+    """Today in the user's timezone (the day being logged)."""
+    return datetime.date.fromisoformat(st.session_state.log_day)
+
+def refresh_rollups(since=None):
+    """Recomputes this user's week/month rollups after a direct history write."""
+    planned = planner.planned_tasks_by_weekday(st.session_state.user_profile)
+    rollover.refresh_rollups(storage, user_id, planned, since)
+
+def sample_history():
+    """A few made-up days for an empty account. Shown with COACH_DEMO_DATA, never stored."""
+    rng = random.Random(user_id)
+    today = local_date()
+    return [
+        {'date': (today - datetime.timedelta(days=i)).isoformat(), 'weight': 60 + (i * 0.1), 'tasks': rng.randint(10, 15)}
+        for i in range(5, 0, -1)
+    ]
+
+def log_increment(field, amount):
+    """Adds `amount` to today's log, writing just that field."""
+    st.session_state.daily_log[field] += amount
+    storage.increment_daily(user_id, st.session_state.log_day, field, amount)
+
+def log_set(field, value):
+    st.session_state.daily_log[field] = value
+    storage.set_daily(user_id, st.session_state.log_day, field, value)
+
+def set_task_done(task_id, done):
+    if done:
+        st.session_state.daily_log['completed_tasks'].add(task_id)
+    else:
+        st.session_state.daily_log['completed_tasks'].discard(task_id)
+    storage.set_task_done(user_id, st.session_state.log_day, task_id, done)
 
-if 'daily_log' not in st.session_state:
-    st.session_state.daily_log = {'protein': 0, 'water': 0.0, 'steps': 0, 'completed_tasks': set(), 'soreness': 0}
-
-if 'history' not in st.session_state:
-    # Generate some demo history
-    today = datetime.date.today()
-    st.session_state.history = []
-    for i in range(5, 0, -1):
-        d = today - datetime.timedelta(days=i)
-        st.session_state.history.append({
-            'date': d.isoformat(),
-            'weight': 60 + (i * 0.1),
-            'tasks': random.randint(10, 15)
-        })
+def update_profile(**fields):
+    """Saves the profile fields whose values actually changed."""
+    changed = {k: v for k, v in fields.items() if st.session_state.user_profile.get(k) != v}
+    if changed:
+        st.session_state.user_profile.update(changed)
+        storage.save_profile(user_id, changed)
+
+def load_history(days=None):
+    """Columnar history for the last `days` days (all when None).
+
+    Ranges up to MAX_SESSION_HISTORY_DAYS are loaded once and kept in the
+    session; new entries are appended to the cached columns instead of
+    reloading. Longer ranges are read on each render.
+    """
+    from fitcoach import analytics
+
+    if DEMO_DATA and not storage.has_history(user_id):
+        return analytics.HistoryColumns(sample_history())
+    start = (local_date() - datetime.timedelta(days=days)).isoformat() if days else None
+    if days is None or days > MAX_SESSION_HISTORY_DAYS:
+        # Too long to keep per session; read it for this render only.
+        st.session_state.pop('history_view', None)
+        return analytics.HistoryColumns(storage.load_history(user_id, start))
+    cached = st.session_state.get('history_view')
+    if cached is None or cached['start'] != start:
+        columns = analytics.HistoryColumns(storage.load_history(user_id, start))
+        cached = st.session_state.history_view = {'start': start, 'columns': columns}
+    return cached['columns']
+
+def save_history_row(row):
+    storage.append_history(user_id, row)
+    refresh_rollups(row['date'])
+    cached = st.session_state.get('history_view')
+    if cached is not None and (cached['start'] is None or row['date'] >= cached['start']):
+        cached['columns'].append(row)
 
 # --- API KEY MANAGEMENT ---
 api_key = os.environ.get("API_KEY")
+if not api_key and os.environ.get("COACH_FAKE_GEMINI"):
+    api_key = "fake-key"
 if not api_key:
     try:
         api_key = st.secrets.get("GEMINI_API_KEY")
@@ -181,125 +234,376 @@ if not api_key:
         if user_key:
             api_key = user_key
             st.success("Key accepted!")
-            st.rerun()
+            rerun()
         else:
             st.markdown("[Get a Key](https://aistudio.google.com/app/apikey)")
             st.warning("Coach features disabled.")
 
 # --- HELPER FUNCTIONS ---
 
-def get_daily_plan_logic(date_obj, user_mode):
-    """Generates the workout plan based on the day and user mode (Home/Gym)."""
-    day_name = date_obj.strftime('%A')
-    
-    # Base Routines
-    morning = ['cat-cow', 'kegel-basic', 'chin-tuck']
-    evening = ['cat-cow']
-    workout = []
-
-    # Logic ported from utils/planGenerator.ts
-    if day_name == 'Monday': # Push
-        if user_mode == 'Gym':
-            workout = ['bench-press', 'overhead-press', 'chair-dips', 'plank', 'farmer-carry']
-        else:
-            workout = ['pushups', 'pike-pushups', 'chair-dips', 'plank', 'farmer-carry']
-            
-    elif day_name == 'Tuesday': # Legs
-        if user_mode == 'Gym':
-            workout = ['front-squat', 'rdl', 'weighted-step-ups', 'tibialis-raise']
-        else:
-            workout = ['goblet-squat', 'rdl', 'weighted-step-ups', 'tibialis-raise']
-            
-    elif day_name == 'Wednesday': # Recovery
-        workout = ['cat-cow', 'kegel-basic', 'dead-bug']
-        
-    elif day_name == 'Thursday': # Pull
-        if user_mode == 'Gym':
-            workout = ['lat-pulldown', 'cable-row', 'face-pulls', 'trap-bar-deadlift']
-        else:
-            workout = ['pullups', 'dumbbell-row', 'chin-tuck', 'rucking']
-            
-    elif day_name == 'Friday': # Impact
-        if user_mode == 'Gym':
-            workout = ['box-jumps', 'trap-bar-deadlift', 'jump-rope']
-        else:
-            workout = ['broad-jumps', 'pushups', 'jump-rope']
-            
-    elif day_name == 'Saturday': # Cardio
-        workout = ['jump-rope', 'dead-bug', 'plank']
+def load_genai():
+    """Imports google-genai on first use; only the AI Coach page needs it."""
+    try:
+        with run_timer.section('import google.genai'):
+            from google import genai
+            from google.genai import types
+    except ImportError:
+        st.error("""
+        **Missing Dependencies**
         
-    else: # Sunday
-        workout = []
+        Please install the required library:
+        ```bash
+        pip install google-genai
+        ```
+        """)
+        st.stop()
+    return genai, types
+
+def get_daily_plan_logic(date_obj, profile, soreness=0):
+    """Generates the workout plan for the day from the rule table in data/plan_rules.json.
 
-    return morning, workout, evening
+    Takes the profile's mode, level and injuries plus today's soreness into
+    account; results are memoized on exactly those inputs.
+    """
+    return planner.daily_plan(date_obj, *planner.plan_key(profile, soreness))
+
+def planned_tasks_by_weekday(profile):
+    """Number of planned tasks for each weekday, Monday first."""
+    return planner.planned_tasks_by_weekday(profile)
+
+@st.cache_resource(show_spinner=False)
+def get_exercise_index():
+    """Search index over the exercise catalog, built once per process."""
+    return ExerciseIndex(catalog.load_catalog())
 
 def get_exercise_details(ex_id):
-    return EXERCISE_DATABASE.get(ex_id, {
-        'name': ex_id.replace('-', ' ').title(), 'desc': 'Check description', 'video': '', 'group': 'General', 'pattern': 'General'
-    })
-
-def generate_ai_response(prompt, history, mode):
-    """Calls Gemini API."""
-    if not api_key:
-        return "Please provide an API Key to use the coach."
-    
+    return catalog.load_catalog().details(ex_id)
+
+def build_coach_config(mode, thinking_budget=router.EXPERT_BUDGET):
+    """Returns the model id and generation config for the selected coach mode.
+
+    `thinking_budget` only applies to Expert; Auto mode passes a smaller one
+    for questions that need less reasoning.
+    """
+    _, types = load_genai()
+    system_instruction = persona.system_instruction(st.session_state.user_profile)
+
+    if mode == "Expert":
+        model_id = router.THINKING_MODEL
+        system_instruction += persona.EXPERT_SUFFIX
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            thinking_config=types.ThinkingConfig(include_thoughts=False, thinking_budget=thinking_budget)
+        )
+    else:
+        model_id = router.FAST_MODEL
+        config = types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            temperature=0.7
+        )
+    return model_id, config
+
+@st.cache_resource(show_spinner=False)
+def get_genai_client(key):
+    """One Gemini client per API key, shared by every session of this process.
+
+    The client keeps its HTTP connection pool alive, so repeated turns reuse the
+    same connections instead of paying a new TLS handshake each time.
+    With COACH_FAKE_GEMINI set, a local stand-in is returned instead (see
+    fitcoach/fake_genai.py).
+    """
+    fake_spec = os.environ.get("COACH_FAKE_GEMINI")
+    if fake_spec:
+        from fitcoach import fake_genai
+        return fake_genai.Client(api_key=key, **fake_genai.parse_options(fake_spec))
+    genai, types = load_genai()
+    # Per-request HTTP timeout (milliseconds), so a hung call can't pin its stream thread forever.
+    timeout_ms = int(float(os.environ.get("COACH_TIMEOUT_SECONDS", 120)) * 1000)
+    return genai.Client(api_key=key, http_options=types.HttpOptions(timeout=timeout_ms))
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Process-wide handle on the on-disk coach reply cache."""
+    path = os.environ.get("COACH_CACHE_PATH", os.path.join(".cache", "coach_responses.sqlite"))
+    return ResponseCache(
+        path,
+        max_entries=int(os.environ.get("COACH_CACHE_MAX_ENTRIES", 1000)),
+        ttl_seconds=float(os.environ.get("COACH_CACHE_TTL_SECONDS", 7 * 24 * 3600)),
+    )
+
+def coach_cache_key(prompt, mode, thinking_budget=router.EXPERT_BUDGET):
+    model_id, config = build_coach_config(mode, thinking_budget)
+    key_mode = mode if mode != "Expert" or thinking_budget == router.EXPERT_BUDGET else f"{mode}:{thinking_budget}"
+    return make_key(prompt, key_mode, model_id, config.system_instruction)
+
+def summarize_history(previous, messages):
+    """Folds `messages` into the running summary without a model call.
+
+    The extractive summary is used right away; with an API key the fold is
+    also noted so `refine_summary` can have the fast model rewrite it on the
+    worker pool, off the script thread.
+    """
+    if api_key:
+        st.session_state.summary_fold = (previous, list(messages))
+    return extractive_summary(previous, messages)
+
+def refine_summary():
+    """Queues the model rewrite of the last fold behind this user's reply.
+
+    The job shares the pool's per-(key, model) rate limit and deadline; if it
+    is throttled, times out or fails, the extractive summary simply stays.
+    """
+    fold = st.session_state.pop('summary_fold', None)
+    if fold is None:
+        return
+    previous, messages = fold
+    folded = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = (
+        "Update this running summary of a coaching chat with the new messages. "
+        "Keep facts about the athlete (pain, injuries, numbers, goals) and advice given. "
+        "Reply with the summary only, under 150 words.\n\n"
+        f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{folded}"
+    )
+    client = get_genai_client(api_key)
+
+    def run():
+        yield client.models.generate_content(model=router.FAST_MODEL, contents=prompt).text or ""
+
+    job = get_worker_pool().submit(user_id, run, limit_key=RateLimiter.key(api_key, router.FAST_MODEL))
+    st.session_state.summary_job = {'job': job, 'folded': get_coach_window().folded}
+
+def apply_refined_summary(window):
+    """Swaps in a finished model summary. True if the window's summary changed."""
+    pending = st.session_state.get('summary_job')
+    if pending is None or not pending['job'].finished:
+        return False
+    del st.session_state.summary_job
+    text = pending['job'].text.strip()
+    # A later fold has already built on the extractive summary; keep that one.
+    if pending['job'].status != DONE or not text or window.folded != pending['folded']:
+        return False
+    window.summary = text
+    return True
+
+def get_coach_window():
+    if 'coach_window' not in st.session_state:
+        st.session_state.coach_window = ConversationWindow(
+            max_turns=int(os.environ.get("COACH_HISTORY_TURNS", 8)),
+            token_budget=int(os.environ.get("COACH_HISTORY_TOKEN_BUDGET", 4000)),
+            summarizer=summarize_history,
+        )
+    return st.session_state.coach_window
+
+def get_coach_chat(mode, transcript, stats=None):
+    """Returns this session's chat for `mode`, creating it when needed.
+
+    The chat is seeded from the history window (rolling summary + recent turns)
+    only when it is created: on the first turn, after "Clear Chat", after a
+    mode switch or whenever older turns get folded into the summary. Otherwise
+    the chat object carries its own history across reruns, so a turn doesn't
+    rebuild the `Content` list or a client. The request itself still carries
+    the chat's whole curated history plus the new message.
+    """
+    _, types = load_genai()
+    model_id, config = build_coach_config(mode)
+    window = get_coach_window()
+    turns = [m for m in transcript if m["role"] != "system"]
+    folded = apply_refined_summary(window) | window.update(turns)
+    session_chat = st.session_state.get('coach_chat')
+    if session_chat is None or session_chat['model'] != model_id or folded:
+        history = [
+            types.Content(role=m["role"], parts=[types.Part.from_text(text=m["content"])])
+            for m in window.history(turns)
+        ]
+        chat = get_genai_client(api_key).chats.create(model=model_id, config=config, history=history)
+        session_chat = st.session_state.coach_chat = {'model': model_id, 'chat': chat}
+    if stats is not None:
+        stats.update(window.stats(turns))
+    return session_chat['chat']
+
+def reset_coach_chat(clear_summary=False):
+    st.session_state.pop('coach_chat', None)
+    if clear_summary:
+        for key in ('coach_window', 'summary_fold', 'summary_job'):
+            st.session_state.pop(key, None)
+
+@st.cache_resource(show_spinner=False)
+def get_worker_pool():
+    """Bounded pool that runs coach calls off the script thread (shared by all sessions).
+
+    Calls are rate limited per (API key, model); COACH_RATE_LIMITS overrides
+    the defaults with JSON like {"gemini-3-pro-preview": [10, 3]}
+    (requests per minute, burst).
+    """
+    limits = {model: tuple(limit) for model, limit in json.loads(os.environ.get("COACH_RATE_LIMITS", "{}")).items()}
+    return CoachWorkerPool(
+        max_workers=int(os.environ.get("COACH_WORKERS", 8)),
+        timeout=float(os.environ.get("COACH_TIMEOUT_SECONDS", 120)),
+        limiter=RateLimiter(limits, max_wait=float(os.environ.get("COACH_RATE_LIMIT_MAX_WAIT", 10))),
+    )
+
+def start_coach_reply(prompt, transcript, mode, cache_key, coalesce=True, route=None):
+    """Queues the model call on the worker pool and records it as this session's pending reply.
+
+    The chat and history window are prepared here, on the script thread, with
+    no model call (folded turns get a model summary from a later pool job);
+    the worker only streams `send_message_stream` (called afresh on each retry).
+    With `coalesce`, an identical in-flight request (same reply-cache key) is
+    shared instead of sent again. `route` is the Auto-mode routing decision;
+    its thinking budget is applied to this message only.
+    """
+    stats = {}
+    chat = get_coach_chat(mode, transcript, stats)
+    budget = route.thinking_budget if route and route.thinking_budget else router.EXPERT_BUDGET
+    model_id, config = build_coach_config(mode, budget)
+    run = lambda: (chunk.text for chunk in chat.send_message_stream(prompt, config=config))
+    job = get_worker_pool().submit(
+        user_id, run,
+        coalesce_key=cache_key if coalesce else None,
+        limit_key=RateLimiter.key(api_key, model_id),
+    )
+    refine_summary()
+    if route:
+        stats['route'] = {'model': model_id, 'thinking_budget': route.thinking_budget, 'reason': route.reason}
+    st.session_state.pending_reply = {
+        'job': job, 'cache_key': cache_key, 'stats': stats, 'shared': job.run is not run,
+        'model': model_id, 'thinking_budget': budget if mode == "Expert" else None,
+    }
+
+def finish_coach_reply(pending):
+    """Moves a finished job into the transcript (and the reply cache on success)."""
+    job = pending['job']
+    text = job.text
+    if job.status != DONE or pending['shared']:
+        # The chat may not have recorded this turn (or another session's chat
+        # answered it); reseed it next time.
+        reset_coach_chat()
+    if job.status == DONE:
+        if pending['cache_key'] and not pending['shared']:
+            get_response_cache().put(pending['cache_key'], text)
+    else:
+        if job.status == TIMEOUT:
+            text += "\n\n*The coach took too long to answer. Please try again.*"
+        elif job.status == CANCELLED:
+            text += "\n\n*Cancelled.*"
+        elif job.status == REJECTED:
+            text += f"\n\n*Dr. Fit is getting a lot of questions right now. Please try again in {max(job.retry_after or 0, 1):.0f}s.*"
+        else:
+            text += f"\n\nError: {str(job.error)}"
+    latency = {**pending['stats'], **job.stats()}
+    if job.status == DONE:
+        # Model time only: queue and throttle waits say nothing about the model.
+        model_seconds = latency['total'] - latency['wait'] - latency['throttled']
+        router.observe(pending['model'], pending['thinking_budget'], model_seconds)
+        saved = router.latency_saved(model_seconds) if 'route' in latency else None
+        if saved is not None:
+            latency['saved'] = saved
+    st.session_state.messages.append({"role": "model", "content": text, "latency": latency})
+
+def page_out_messages():
+    """Archives the oldest chat messages once the session holds more than MAX_SESSION_MESSAGES.
+
+    The transcript is trimmed to half the limit, so this runs every few
+    turns rather than on each one. Only messages the history window has
+    already folded into its summary are archived; the model's context
+    doesn't change.
+    """
+    messages = st.session_state.messages
+    if len(messages) <= MAX_SESSION_MESSAGES:
+        return
+    count = len(messages) - MAX_SESSION_MESSAGES // 2
+    window = st.session_state.get('coach_window')
+    if window is not None:
+        count = min(count, window.folded)
+        window.folded -= count
+        if 'summary_job' in st.session_state:
+            st.session_state.summary_job['folded'] -= count
+    if count:
+        storage.archive_messages(user_id, messages[:count])
+        del messages[:count]
+
+def take_fresh_answer():
+    # "Fresh answer" covers one message: hand it to this submit and untick it.
+    st.session_state.skip_cache = st.session_state.pop('fresh_answer', False)
+
+def cancel_coach_reply():
+    get_worker_pool().cancel_user(user_id)
+    st.session_state.pop('pending_reply', None)
+
+def format_latency(stats):
+    if stats.get('cached'):
+        return f"⚡ Cached reply · {stats['total']:.2f}s"
+    text = f"⏱ First token {stats['ttft']:.2f}s · Total {stats['total']:.2f}s"
+    if stats.get('wait', 0) >= 0.05:
+        text += f" · Queued {stats['wait']:.2f}s"
+    if 'route' in stats:
+        route = stats['route']
+        target = "Expert" if route['thinking_budget'] else "Standard"
+        text += f" · Auto → {target} ({route['reason']})"
+        if stats.get('saved', 0) >= 0.05:
+            text += f", ~{stats['saved']:.1f}s saved vs Expert (est.)"
+    if 'history_messages' in stats:
+        text += f" · History {stats['history_messages']} msgs (~{stats['history_tokens']} tokens)"
+    return text
+
+@contextlib.contextmanager
+def timed_section(name):
+    """`run_timer.section` that also covers fragment-only reruns.
+
+    A fragment rerun does not execute the script, so the `run_timer` it sees is
+    the already finished one from the last full run; time it as its own run.
+    """
+    if not run_timer.finished:
+        with run_timer.section(name):
+            yield
+        return
+    fragment_timer = timing.RunTimer(page=run_timer.page, session=st.session_state)
     try:
-        client = genai.Client(api_key=api_key)
+        with fragment_timer.section(name):
+            yield
+    finally:
+        fragment_timer.finish(status='fragment')
+
+def render_daily_targets():
+    with timed_section('sidebar.targets'):
+        st.subheader("Daily Targets")
+        p_prog = st.session_state.daily_log['protein'] / DIET_GUIDELINES['protein']
+        st.progress(min(p_prog, 1.0), text=f"Protein: {st.session_state.daily_log['protein']}/{DIET_GUIDELINES['protein']}g")
         
-        system_instruction = """
-        You are Dr. Fit, an expert Sports Medicine Physician, Strength & Conditioning Coach, and Nutritionist.
-        You are coaching Gaurav (24M, 60kg, 5'7", Goal: Bone Strength & Lean Muscle).
-        Core Knowledge: Wolff's Law (Bone density), Axial Loading, Progressive Overload.
-        Be concise, clinical, and encouraging.
-        """
+        w_prog = st.session_state.daily_log['water'] / DIET_GUIDELINES['water']
+        st.progress(min(w_prog, 1.0), text=f"Water: {st.session_state.daily_log['water']:.1f}/{DIET_GUIDELINES['water']}L")
         
-        if mode == "Expert":
-            model_id = "gemini-3-pro-preview"
-            system_instruction += "\n\n*** EXPERT MODE ***\nUse deep reasoning to analyze biomechanics and physiology."
-            config = types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                thinking_config=types.ThinkingConfig(include_thoughts=False, thinking_budget=32768)
-            )
-        else:
-            model_id = "gemini-2.5-flash-lite-latest"
-            config = types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                temperature=0.7
-            )
-            
-        chat = client.chats.create(model=model_id, config=config, history=history)
-        response = chat.send_message(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error: {str(e)}"
+        s_prog = st.session_state.daily_log['steps'] / DIET_GUIDELINES['steps']
+        st.progress(min(s_prog, 1.0), text=f"Steps: {st.session_state.daily_log['steps']}/{DIET_GUIDELINES['steps']}")
 
 # --- UI LAYOUT ---
 
 # Sidebar
 with st.sidebar:
-    st.title("🏋️ Gaurav Fit Coach")
+    st.title("🏋️ Fit Coach")
     st.caption(f"User: {st.session_state.user_profile['name']} | Level: {st.session_state.user_profile['level']}")
+    if DEMO_SIGN_IN and st.button("Switch user"):
+        st.query_params.pop("user", None)
+        rerun()
     
     st.divider()
     
     menu = st.radio("Navigation", ["Today's Plan", "Weekly Split", "Exercise Library", "Meal Plan", "AI Coach", "Progress", "Settings"])
+    run_timer.page = menu
     
     st.divider()
     
-    st.subheader("Daily Targets")
-    p_prog = st.session_state.daily_log['protein'] / DIET_GUIDELINES['protein']
-    st.progress(min(p_prog, 1.0), text=f"Protein: {st.session_state.daily_log['protein']}/{DIET_GUIDELINES['protein']}g")
-    
-    w_prog = st.session_state.daily_log['water'] / DIET_GUIDELINES['water']
-    st.progress(min(w_prog, 1.0), text=f"Water: {st.session_state.daily_log['water']:.1f}/{DIET_GUIDELINES['water']}L")
-    
-    s_prog = st.session_state.daily_log['steps'] / DIET_GUIDELINES['steps']
-    st.progress(min(s_prog, 1.0), text=f"Steps: {st.session_state.daily_log['steps']}/{DIET_GUIDELINES['steps']}")
+    # Filled by the Macro Logger fragment on Today's Plan, directly elsewhere.
+    targets_box = st.container()
+
+if menu != "Today's Plan":
+    with targets_box:
+        render_daily_targets()
 
 # Main Content
 
 if menu == "Today's Plan":
-    today = datetime.date.today()
+    today = local_date()
     day_name = today.strftime('%A')
     mode = st.session_state.user_profile['workout_mode']
     
@@ -309,31 +613,37 @@ if menu == "Today's Plan":
         st.header(f"📅 {day_name}'s Protocol")
         st.caption(f"Focus: {WEEKLY_SPLIT.get(day_name, 'Rest')}")
         
-        morning, workout, evening = get_daily_plan_logic(today, mode)
+        morning, workout, evening = get_daily_plan_logic(today, st.session_state.user_profile, st.session_state.daily_log['soreness'])
+        recovery = planner.recovery_score(st.session_state.daily_log['soreness'])
+        if recovery != 'High':
+            st.warning(f"Recovery: {recovery} — workout adjusted for soreness.")
         
+        # Each list is a fragment: "Mark Complete" reruns only that list.
+        @st.fragment
         def render_task_list(title, task_ids, section_uid):
             if not task_ids:
                 return
-            st.subheader(title)
-            for i, tid in enumerate(task_ids):
-                ex = get_exercise_details(tid)
-                is_done = tid in st.session_state.daily_log['completed_tasks']
-                
-                # Unique key: section_uid + tid + index
-                unique_key = f"btn_{section_uid}_{tid}_{i}"
-                
-                with st.expander(f"{'✅' if is_done else '⬜'} {ex['name']}", expanded=False):
-                    st.markdown(f"**Rx:** {ex['desc']}")
-                    st.caption(f"Target: {ex['group']} • Pattern: {ex['pattern']}")
-                    if ex['video']:
-                        st.markdown(f"[▶ Watch Demo]({ex['video']})")
+            with timed_section('today.tasks'):
+                st.subheader(title)
+                for i, tid in enumerate(task_ids):
+                    ex = get_exercise_details(tid)
+                    is_done = tid in st.session_state.daily_log['completed_tasks']
+                    
+                    # Unique key: section_uid + tid + index
+                    unique_key = f"btn_{section_uid}_{tid}_{i}"
                     
-                    if st.button(f"Mark {'Undone' if is_done else 'Complete'}", key=unique_key):
-                        if is_done:
-                            st.session_state.daily_log['completed_tasks'].remove(tid)
-                        else:
-                            st.session_state.daily_log['completed_tasks'].add(tid)
-                        st.rerun()
+                    with st.expander(f"{'✅' if is_done else '⬜'} {ex.name}", expanded=False):
+                        st.markdown(f"**Rx:** {ex.prescription}")
+                        st.caption(f"Target: {ex.group} • Pattern: {ex.pattern} • Level: {ex.level}")
+                        if ex.form_steps:
+                            st.markdown("\n".join(f"{n}. {step}" for n, step in enumerate(ex.form_steps, 1)))
+                        if ex.safety_notes:
+                            st.caption("⚠️ " + " ".join(ex.safety_notes))
+                        if ex.video:
+                            st.markdown(f"[▶ Watch Demo]({ex.video})")
+                        
+                        st.button(f"Mark {'Undone' if is_done else 'Complete'}", key=unique_key,
+                                  on_click=set_task_done, args=(tid, not is_done))
 
         render_task_list("🌅 Morning Routine", morning, "morning")
         
@@ -347,180 +657,373 @@ if menu == "Today's Plan":
         render_task_list("🌙 Evening Recovery", evening, "evening")
 
     with col2:
-        st.markdown('<div class="card">', unsafe_allow_html=True)
-        st.subheader("📝 Macro Logger")
-        
-        st.write("**Protein**")
-        c1, c2 = st.columns(2)
-        if c1.button("+10g"): 
-            st.session_state.daily_log['protein'] += 10
-            st.rerun()
-        if c2.button("+25g"): 
-            st.session_state.daily_log['protein'] += 25
-            st.rerun()
-            
-        st.write("**Water**")
-        c3, c4 = st.columns(2)
-        if c3.button("+250ml"): 
-            st.session_state.daily_log['water'] += 0.25
-            st.rerun()
-        if c4.button("+500ml"): 
-            st.session_state.daily_log['water'] += 0.5
-            st.rerun()
+        # Button callbacks update the log before the fragment reruns, so a click
+        # redraws only the logger and the sidebar targets instead of the page.
+        @st.fragment
+        def macro_logger():
+            with timed_section('today.macro_logger'):
+                st.markdown('<div class="card">', unsafe_allow_html=True)
+                st.subheader("📝 Macro Logger")
             
-        st.write("**Steps**")
-        if st.button("+1000 Steps"):
-            st.session_state.daily_log['steps'] += 1000
-            st.rerun()
-        st.markdown('</div>', unsafe_allow_html=True)
+                st.write("**Protein**")
+                c1, c2 = st.columns(2)
+                c1.button("+10g", on_click=log_increment, args=('protein', 10))
+                c2.button("+25g", on_click=log_increment, args=('protein', 25))
+                
+                st.write("**Water**")
+                c3, c4 = st.columns(2)
+                c3.button("+250ml", on_click=log_increment, args=('water', 0.25))
+                c4.button("+500ml", on_click=log_increment, args=('water', 0.5))
+                
+                st.write("**Steps**")
+                st.button("+1000 Steps", on_click=log_increment, args=('steps', 1000))
+                st.markdown('</div>', unsafe_allow_html=True)
+            with targets_box:
+                render_daily_targets()
+
+        macro_logger()
         
         with st.expander("Recovery Check-in"):
             soreness = st.slider("Muscle Soreness (0-10)", 0, 10, st.session_state.daily_log['soreness'])
             if soreness != st.session_state.daily_log['soreness']:
-                st.session_state.daily_log['soreness'] = soreness
+                previous = planner.recovery_score(st.session_state.daily_log['soreness'])
+                log_set('soreness', soreness)
                 st.success("Logged!")
+                if planner.recovery_score(soreness) != previous:
+                    # The plan on the left was drawn with the old recovery score.
+                    rerun()
 
 elif menu == "Weekly Split":
     st.header("🗓️ Weekly Training Split")
     st.caption("Periodized for Bone Density & Hypertrophy")
     
-    for day, focus in WEEKLY_SPLIT.items():
-        with st.container():
-            st.markdown(f"**{day}**")
-            st.info(focus)
+    with run_timer.section('weekly.render'):
+        profile = st.session_state.user_profile
+        week = planner.week_plans(local_date(), *planner.plan_key(profile)[:3])
+        days = tuple((day, focus, workout) for (day, focus), (_, (_, workout, _)) in zip(WEEKLY_SPLIT.items(), week))
+        st.markdown(render.weekly_split_html(catalog.load_catalog().version, days), unsafe_allow_html=True)
 
 elif menu == "Exercise Library":
     st.header("📚 Exercise Database")
     
+    index = get_exercise_index()
     search_term = st.text_input("Search exercises...", "")
-    filter_mode = st.selectbox("Filter by Mode", ["All", "Home", "Gym"])
-    
-    cols = st.columns(2)
-    idx = 0
+    f1, f2, f3 = st.columns(3)
+    filter_mode = f1.selectbox("Filter by Mode", ["All", "Home", "Gym"])
+    filter_pattern = f2.selectbox("Pattern", ["All"] + index.facet_values('pattern'))
+    filter_group = f3.selectbox("Muscle Group", ["All"] + index.facet_values('group'))
+
+    version = catalog.load_catalog().version
+    filters = dict(query=search_term, mode=filter_mode, pattern=filter_pattern, group=filter_group)
+    with run_timer.section('library.search'):
+        results = render.library_results(index, version, **filters)
+    _, page_count = paginate(results, 1, render.LIBRARY_PAGE_SIZE)
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1) if page_count > 1 else 1
+    st.caption(f"{len(results)} exercises")
     
-    for eid, data in EXERCISE_DATABASE.items():
-        # Filtering
-        if search_term.lower() not in data['name'].lower() and search_term.lower() not in data['group'].lower():
-            continue
-        if filter_mode != "All" and filter_mode not in data['mode']:
-            continue
-            
-        with cols[idx % 2]:
-            st.markdown(f"""
-            <div class="card">
-                <h4>{data['name']}</h4>
-                <p style="font-size:12px; color:gray;">{data['group']} | {', '.join(data['mode'])}</p>
-                <p><b>{data['desc']}</b></p>
-                <a href="{data['video']}" target="_blank">▶ Watch Tutorial</a>
-            </div>
-            """, unsafe_allow_html=True)
-        idx += 1
+    with run_timer.section('library.cards'):
+        # The whole page is one pre-rendered block (see fitcoach.render).
+        st.markdown(render.library_page(index, version, page=page, **filters), unsafe_allow_html=True)
 
 elif menu == "Meal Plan":
     st.header("🍽️ Meal Planner")
     
+    with run_timer.section('import nutrition'):
+        from fitcoach import nutrition
+
     diet_type = st.session_state.user_profile['diet']
     st.info(f"Current Preference: **{diet_type}**")
-    
-    plan = MEAL_TEMPLATES.get(diet_type, MEAL_TEMPLATES['Veg'])
-    
-    for meal, details in plan.items():
-        with st.expander(f"{meal}: {details['name']}", expanded=True):
+
+    diet, calories, protein = nutrition.plan_key(st.session_state.user_profile, DIET_GUIDELINES)
+    today = local_date()
+    plan = nutrition.day_plan(today, diet, calories, protein)
+
+    t1, t2 = st.columns(2)
+    t1.metric("Calories", plan.calories, f"{plan.calories - calories:+d} vs target", delta_color="off")
+    t2.metric("Protein", f"{plan.protein}g", f"{plan.protein - protein:+d}g vs target")
+
+    for meal in plan.meals:
+        with st.expander(f"{meal.slot}: {meal.name}", expanded=True):
             col1, col2 = st.columns([3, 1])
             with col1:
-                st.write(f"**Ingredients:** {', '.join(details['ingredients'])}")
+                st.write(f"**Ingredients:** {', '.join(meal.items)}")
             with col2:
-                st.metric("Calories", details['cals'])
-                st.metric("Protein", f"{details['pro']}g")
+                st.metric("Calories", meal.calories)
+                st.metric("Protein", f"{meal.protein}g")
+
+    with st.expander("This week"):
+        rows = ["| Day | " + " | ".join(nutrition.SLOTS) + " | kcal | Protein |", "|---" * (len(nutrition.SLOTS) + 3) + "|"]
+        for day in nutrition.week_plan(today - datetime.timedelta(days=today.weekday()), diet, calories, protein):
+            meals = " | ".join(m.name for m in day.meals)
+            rows.append(f"| {day.date:%a} | {meals} | {day.calories} | {day.protein}g |")
+        st.markdown("\n".join(rows))
 
 elif menu == "AI Coach":
+    load_genai()
     st.header("🤖 Dr. Fit")
     st.caption("Ask about form, pain, or nutrition.")
+    cache_stats = get_response_cache().stats()
+    st.caption(f"Reply cache: {cache_stats['hits']} hits · {cache_stats['misses']} misses · {cache_stats['entries']} stored")
+    pool_stats = get_worker_pool().metrics()
+    st.caption(f"Coach queue: {pool_stats['queue_depth']} waiting · {pool_stats['running']}/{pool_stats['max_workers']} busy · p95 wait {pool_stats['wait_ms_p95']:.0f} ms")
     
-    col_mode, col_clear = st.columns([3,1])
+    col_mode, col_stream, col_clear = st.columns([3,1,1])
     with col_mode:
-        coach_mode = st.radio("Coach Mode", ["Standard", "Expert"], horizontal=True, help="Expert mode uses reasoning (Gemini 2.0 Flash Thinking).")
+        coach_mode = st.radio(
+            "Coach Mode", ["Auto", "Standard", "Expert"], horizontal=True,
+            help="Expert mode uses reasoning (Gemini 2.0 Flash Thinking). Auto sends pain, injury and form questions to Expert and everything else to Standard.",
+        )
+    with col_stream:
+        stream_replies = st.toggle("Stream", value=True, help="Show the reply as it is generated.")
+        st.checkbox("Fresh answer", key='fresh_answer', help="Bypass the reply cache for the next message.")
     with col_clear:
         if st.button("Clear Chat"):
+            cancel_coach_reply()
             st.session_state.messages = []
-            st.rerun()
+            st.session_state.pop('archive_shown', None)
+            storage.clear_messages(user_id)
+            reset_coach_chat(clear_summary=True)
+            rerun()
 
     if "messages" not in st.session_state:
-        st.session_state.messages = [{"role": "model", "content": "Hello Gaurav! How can I help you reach your goals today?"}]
+        name = st.session_state.user_profile['name']
+        st.session_state.messages = [{"role": "model", "content": f"Hello {name}! How can I help you reach your goals today?"}]
+    page_out_messages()
+
+    archived = storage.count_messages(user_id)
+    if archived:
+        shown = min(st.session_state.get('archive_shown', 0), archived)
+        if shown < archived and st.button(f"Show earlier messages ({archived - shown} archived)"):
+            st.session_state.archive_shown = shown + ARCHIVE_PAGE
+            rerun()
+        # Read from storage on each render; only the page count lives in the session.
+        for msg in storage.load_messages(user_id, limit=shown) if shown else ():
+            with st.chat_message(msg["role"]):
+                st.markdown(msg["content"])
 
     for msg in st.session_state.messages:
         with st.chat_message(msg["role"]):
             st.markdown(msg["content"])
+            if "latency" in msg:
+                st.caption(format_latency(msg["latency"]))
 
-    if prompt := st.chat_input("Ask Dr. Fit..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        with st.chat_message("user"):
-            st.markdown(prompt)
-
+    @st.fragment(run_every=0.5)
+    def pending_reply_view():
+        """Polls this session's queued/running coach job without blocking the script."""
+        pending = st.session_state.get('pending_reply')
+        if pending is None:
+            return
+        job = pending['job']
+        # check_deadline() ends an overdue job even while its worker is stuck.
+        if job.check_deadline():
+            finish_coach_reply(pending)
+            del st.session_state.pending_reply
+            rerun()
         with st.chat_message("model"):
-            with st.spinner("Thinking..."):
-                # Prepare history
-                history_for_api = [
-                    types.Content(role=m["role"], parts=[types.Part.from_text(text=m["content"])]) 
-                    for m in st.session_state.messages if m["role"] != "system"
-                ]
-                
-                response_text = generate_ai_response(prompt, history_for_api, coach_mode)
-                st.markdown(response_text)
-                st.session_state.messages.append({"role": "model", "content": response_text})
+            if job.status == QUEUED:
+                st.caption("⏳ Waiting for a free coach…")
+            elif job.status == THROTTLED:
+                st.caption(f"⏳ Rate limited, starting in {job.retry_after:.0f}s…")
+            elif stream_replies and job.chunks:
+                st.markdown(job.text + "▌")
+            else:
+                st.caption("Thinking...")
+
+    pending_reply_view()
+
+    prompt = st.chat_input("Ask Dr. Fit...", disabled='pending_reply' in st.session_state, on_submit=take_fresh_answer)
+    if prompt and 'pending_reply' not in st.session_state:
+        skip_cache = st.session_state.pop('skip_cache', False)
+        transcript = list(st.session_state.messages)
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        cache = get_response_cache()
+        route = router.route(prompt) if coach_mode == "Auto" else None
+        reply_mode = route.mode if route else coach_mode
+        budget = route.thinking_budget if route and route.thinking_budget else router.EXPERT_BUDGET
+        cache_key = coach_cache_key(prompt, reply_mode, budget) if api_key else None
+        start = time.perf_counter()
+        cached_text = cache.get(cache_key) if cache_key and not skip_cache else None
+        if not api_key:
+            st.session_state.messages.append({"role": "model", "content": "Please provide an API Key to use the coach."})
+        elif cached_text is not None:
+            latency = {'cached': True, 'ttft': time.perf_counter() - start}
+            latency['total'] = latency['ttft']
+            st.session_state.messages.append({"role": "model", "content": cached_text, "latency": latency})
+            # The live chat never saw this turn; rebuild it from the transcript next time.
+            reset_coach_chat()
+        else:
+            start_coach_reply(prompt, transcript, reply_mode, cache_key, coalesce=not skip_cache, route=route)
+        rerun()
 
 elif menu == "Progress":
+    with run_timer.section('import pandas'):
+        import pandas as pd
+        from fitcoach import analytics, transfer
+
     st.header("📈 Progress Tracker")
     
-    # Charts
-    if st.session_state.history:
-        df = pd.DataFrame(st.session_state.history)
-        
-        tab1, tab2 = st.tabs(["Weight Trend", "Habit Consistency"])
+    ranges = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All time": None}
+    history_range = st.selectbox("Range", list(ranges), index=1)
+    history = load_history(ranges[history_range])
+    if DEMO_DATA and not storage.has_history(user_id):
+        st.caption("Sample data. Save your first entry below to start your own history.")
+
+    with run_timer.section('progress.charts'):
+        # Charts
+        if len(history):
+            planned = planned_tasks_by_weekday(st.session_state.user_profile)
+            current_streak, longest_streak = analytics.streaks(history, planned, today=local_date())
+            m1, m2 = st.columns(2)
+            m1.metric("Current Streak", f"{current_streak} days")
+            m2.metric("Longest Streak", f"{longest_streak} days")
+
+            tab1, tab2, tab3 = st.tabs(["Weight Trend", "Habit Consistency", "Monthly"])
         
-        with tab1:
-            st.line_chart(df.set_index('date')['weight'])
+            with tab1:
+                days, weight = history.calendar(history.weight)
+                days, (weight, ma7, ma28) = analytics.downsample(
+                    days, [weight, analytics.rolling_mean(weight, 7), analytics.rolling_mean(weight, 28)]
+                )
+                st.line_chart(pd.DataFrame({'Weight': weight, '7-day avg': ma7, '28-day avg': ma28}, index=days))
         
-        with tab2:
-            st.bar_chart(df.set_index('date')['tasks'])
+            # Week and month aggregates are precomputed by the rollover job.
+            with tab2:
+                weeks = pd.DataFrame(storage.load_rollups(user_id, 'week', str(analytics.period_start(history.dates[:1], 'week')[0])))
+                if len(weeks):
+                    st.caption("Weekly task completion rate")
+                    weeks.index = pd.to_datetime(weeks['start'])
+                    st.bar_chart(weeks[['completion']].astype(float).rename(columns={'completion': 'Completion'}))
+            with tab3:
+                months = pd.DataFrame(storage.load_rollups(user_id, 'month', str(analytics.period_start(history.dates[:1], 'month')[0])))
+                if len(months):
+                    months.index = pd.to_datetime(months['start']).dt.strftime('%b %Y')
+                    st.caption("Monthly averages")
+                    st.bar_chart(months[['completion']].astype(float).rename(columns={'completion': 'Completion'}))
+                    st.dataframe(months[['days', 'completion', 'tasks', 'protein', 'water', 'steps']].astype(float).round(2))
             
     # Entry Form
     with st.expander("Log Today's Stats", expanded=True):
         with st.form("log_stats"):
             w = st.number_input("Weight (kg)", value=st.session_state.user_profile['weight'])
             if st.form_submit_button("Save Entry"):
-                st.session_state.user_profile['weight'] = w
-                st.session_state.history.append({
-                    'date': datetime.date.today().isoformat(),
+                update_profile(weight=w)
+                save_history_row({
+                    'date': st.session_state.log_day,
                     'weight': w,
                     'tasks': len(st.session_state.daily_log['completed_tasks'])
                 })
                 st.success("Saved!")
-                st.rerun()
+                rerun()
                 
-    if st.button("Download Data (JSON)"):
-        data_str = json.dumps({'user': st.session_state.user_profile, 'history': st.session_state.history})
-        st.download_button("Click to Download", data_str, "gaurav_fit_data.json", "application/json")
+    with st.expander("Import / Export"):
+        kinds = {"History": 'history', "Daily logs": 'daily'}
+        c1, c2, c3 = st.columns(3)
+        kind_label = c1.selectbox("Data", list(kinds))
+        kind = kinds[kind_label]
+        export_format = c2.selectbox("Format", list(transfer.FORMATS), format_func=str.upper)
+        today = local_date()
+        export_range = c3.date_input("Date range", (today - datetime.timedelta(days=365), today), max_value=today)
+        export_start = export_range[0].isoformat() if export_range else None
+        export_end = export_range[1].isoformat() if len(export_range) > 1 else None
+        # Generated on click, off the script thread, in batches.
+        st.download_button(
+            f"Download {kind_label}",
+            data=lambda: transfer.export_file(storage, user_id, kind, export_format, export_start, export_end).read(),
+            file_name=transfer.file_name(kind, export_format, user_id),
+            mime=transfer.FORMATS[export_format][1],
+            on_click='ignore',
+        )
+
+        upload = st.file_uploader("Import from another tracker", type=["csv", "ndjson", "jsonl", "parquet"])
+        if upload is not None and st.button(f"Import {upload.name} into {kind_label}"):
+            extension = upload.name.rsplit(".", 1)[-1].lower()
+            try:
+                result = transfer.import_file(
+                    storage, user_id, upload, kind, {'jsonl': 'ndjson'}.get(extension, extension), today=local_date()
+                )
+            except ValueError as e:
+                st.error(f"Import failed: {e}")
+            else:
+                # Drop session copies so the charts and today's log show the imported rows.
+                st.session_state.pop('history_view', None)
+                days = result.pop('days')
+                if kind == 'daily':
+                    # Imported days may predate the last rollover; compact them now.
+                    days = [day for day in days if day < st.session_state.log_day]
+                    rollover.compact_days(storage, user_id, days, st.session_state.user_profile)
+                else:
+                    refresh_rollups()
+                st.session_state.pop('log_day', None)
+                st.session_state.import_result = result
+                rerun()
+        if result := st.session_state.pop('import_result', None):
+            st.success(f"Imported {result['imported']} rows, skipped {result['rejected']}.")
+            for error in result['errors']:
+                st.caption(error)
 
 elif menu == "Settings":
     st.header("⚙️ Settings")
     
     with st.form("settings_form"):
         st.subheader("Profile")
-        name = st.text_input("Name", st.session_state.user_profile['name'])
+        profile = st.session_state.user_profile
+        name = st.text_input("Name", profile['name'])
+        c1, c2, c3 = st.columns(3)
+        age = c1.number_input("Age", min_value=0, max_value=120, value=profile.get('age') or 0, help="0 = not set")
+        sexes = ["", "Male", "Female"]
+        sex = c2.selectbox("Sex", sexes, index=sexes.index(profile.get('sex') or ""), format_func=lambda v: v or "Not set")
+        height = c3.text_input("Height", profile.get('height') or "")
+        goal = st.text_input("Goal", profile.get('goal') or "")
         
         st.subheader("Training Preferences")
         mode = st.selectbox("Workout Mode", ["Home", "Gym"], index=0 if st.session_state.user_profile['workout_mode'] == 'Home' else 1)
+        levels = ["Beginner", "Intermediate", "Advanced"]
+        level = st.selectbox("Level", levels, index=levels.index(st.session_state.user_profile['level']))
+        injuries = st.multiselect("Injuries / Pain", ["Knee", "Back", "Shoulder"], default=st.session_state.user_profile['injuries'])
         diet = st.selectbox("Diet Type", ["Non-veg", "Veg"], index=0 if st.session_state.user_profile['diet'] == 'Non-veg' else 1)
+        # Your day (and its log) rolls over at midnight in this timezone.
+        timezones = [""] + sorted(zoneinfo.available_timezones())
+        current_tz = st.session_state.user_profile.get('timezone') or ""
+        timezone = st.selectbox(
+            "Timezone", timezones, index=timezones.index(current_tz) if current_tz in timezones else 0,
+            format_func=lambda tz: tz or "Server time",
+        )
         
         if st.form_submit_button("Save Settings"):
-            st.session_state.user_profile['name'] = name
-            st.session_state.user_profile['workout_mode'] = mode
-            st.session_state.user_profile['diet'] = diet
+            update_profile(
+                name=name, age=age or None, sex=sex or None, height=height, goal=goal,
+                workout_mode=mode, diet=diet, level=level, injuries=injuries, timezone=timezone or None,
+            )
             st.success("Settings saved!")
-            st.rerun()
+            rerun()
             
     st.markdown("---")
     if st.button("⚠️ Reset All Data", type="primary"):
+        storage.delete_user(user_id)
+        session_memory.forget(st.session_state.get('_session_id'))
         st.session_state.clear()
-        st.rerun()
+        rerun()
+
+with run_timer.section('session_memory'):
+    session_id = st.session_state.setdefault('_session_id', uuid.uuid4().hex)
+    session_bytes = session_memory.record(session_id, user_id, st.session_state)
+
+run_timer.finish()
+if st.query_params.get("debug"):
+    # Hidden debug panel: add ?debug=1 to the URL.
+    with st.sidebar.expander("🛠 Debug: render timing"):
+        recent = timing.session_runs(st.session_state)
+        if recent:
+            last = recent[-1]
+            st.caption(f"Last run: {last['total_ms']} ms · run {last['run_in_interaction']} of interaction {last['interaction']}")
+            st.json(last['sections_ms'])
+        st.write("**This session**")
+        st.json([{k: r[k] for k in ('page', 'status', 'interaction', 'run_in_interaction', 'total_ms')} for r in recent], expanded=False)
+        st.write("**Process**")
+        st.json(timing.report(), expanded=False)
+        st.write("**Coach worker pool**")
+        st.json(get_worker_pool().metrics(), expanded=False)
+        st.write("**Day rollover**")
+        st.json(scheduler.stats(), expanded=False)
+        st.write(f"**Session memory** (this session ~{session_bytes / 1024:.1f} KB)")
+        st.json(session_memory.report(), expanded=False)
@@ -0,0 +1,8 @@
+import pytest
+
+from fitcoach.storage import open_storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return open_storage(f"sqlite:///{tmp_path / 'fitcoach.sqlite'}")
@@ -0,0 +1,27 @@
+import datetime
+
+from fitcoach import analytics
+
+PLANNED = [2] * 7
+
+
+def _history(start, days):
+    start = datetime.date.fromisoformat(start)
+    return analytics.HistoryColumns(
+        {'date': (start + datetime.timedelta(days=i)).isoformat(), 'tasks': 2} for i in range(days)
+    )
+
+
+def test_current_streak_runs_to_the_last_entry_without_today():
+    assert analytics.streaks(_history('2026-03-01', 5), PLANNED) == (5, 5)
+
+
+def test_current_streak_counts_through_yesterday():
+    history = _history('2026-03-01', 5)
+    assert analytics.streaks(history, PLANNED, today=datetime.date(2026, 3, 6)) == (5, 5)
+    assert analytics.streaks(history, PLANNED, today=datetime.date(2026, 3, 5)) == (5, 5)
+
+
+def test_current_streak_is_broken_after_a_missed_day():
+    history = _history('2026-03-01', 5)
+    assert analytics.streaks(history, PLANNED, today=datetime.date(2026, 3, 7)) == (0, 5)
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+
+from fitcoach.coach_workers import CANCELLED, DONE, ERROR, REJECTED, TIMEOUT, CoachWorkerPool
+from fitcoach.rate_limit import RateLimiter
+
+
+@pytest.fixture
+def pool():
+    return CoachWorkerPool(max_workers=2, timeout=5.0, max_retries=1, backoff=0.01)
+
+
+def wait_for(job, seconds=3.0):
+    end = time.perf_counter() + seconds
+    while not job.finished and time.perf_counter() < end:
+        time.sleep(0.01)
+    return job.status
+
+
+def hang(release):
+    def run():
+        release.wait(10)
+        yield "late"
+    return run
+
+
+def test_job_streams_to_done(pool):
+    job = pool.submit('u', lambda: iter(["Hello ", "there"]))
+    assert wait_for(job) == DONE
+    assert job.text == "Hello there"
+    assert job.first_chunk_at is not None
+
+
+def test_call_hung_before_first_chunk_times_out(pool):
+    release = threading.Event()
+    job = pool.submit('u', hang(release), timeout=0.2)
+    try:
+        assert wait_for(job, 2.0) == TIMEOUT
+        assert job.stats()['total'] < 1.5
+        # The user's queue is free again although the hung call never returned.
+        assert wait_for(pool.submit('u', lambda: iter(["ok"]))) == DONE
+    finally:
+        release.set()
+
+
+def test_check_deadline_marks_overdue_job(pool):
+    release = threading.Event()
+    job = pool.submit('u', hang(release), timeout=60.0)
+    try:
+        while job.started_at is None:
+            time.sleep(0.01)
+        job.timeout = 0.0
+        assert job.check_deadline()
+        assert job.status == TIMEOUT
+        assert job.cancel_event.is_set()
+    finally:
+        release.set()
+
+
+def test_cancel_user_stops_running_and_queued_jobs(pool):
+    release = threading.Event()
+    running = pool.submit('u', hang(release))
+    queued = pool.submit('u', lambda: iter(["never"]))
+    try:
+        pool.cancel_user('u')
+        assert wait_for(running) == CANCELLED
+        assert wait_for(queued) == CANCELLED
+        assert queued.chunks == []
+    finally:
+        release.set()
+
+
+def test_transient_error_is_retried(pool):
+    calls = []
+
+    def run():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return iter(["ok"])
+
+    job = pool.submit('u', run)
+    assert wait_for(job) == DONE
+    assert job.attempts == 2
+
+
+def test_permanent_error_is_not_retried(pool):
+    def run():
+        raise ValueError("bad request")
+
+    job = pool.submit('u', run)
+    assert wait_for(job) == ERROR
+    assert job.attempts == 1
+    assert isinstance(job.error, ValueError)
+
+
+def test_rate_limited_job_is_rejected(pool):
+    pool.limiter = RateLimiter({'m': (1, 1)}, max_wait=0.0)
+    key = pool.limiter.key('api-key', 'm')
+    first = pool.submit('u', lambda: iter(["ok"]), limit_key=key)
+    assert wait_for(first) == DONE
+    second = pool.submit('u', lambda: iter(["ok"]), limit_key=key)
+    assert wait_for(second) == REJECTED
+    assert second.retry_after > 0
+
+
+def test_throttle_wait_is_reported_apart_from_the_queue(pool):
+    pool.limiter = RateLimiter({'m': (600, 1)}, max_wait=1.0)
+    key = pool.limiter.key('api-key', 'm')
+    assert wait_for(pool.submit('u', lambda: iter(["ok"]), limit_key=key)) == DONE
+    job = pool.submit('u', lambda: iter(["ok"]), limit_key=key)
+    assert wait_for(job) == DONE
+    stats = job.stats()
+    assert 0.05 < stats['throttled'] <= stats['total'] - stats['wait']
+
+
+def test_same_coalesce_key_shares_one_job(pool):
+    release = threading.Event()
+    first = pool.submit('a', hang(release), coalesce_key='k')
+    second = pool.submit('b', lambda: iter(["other"]), coalesce_key='k')
+    assert second is first
+    release.set()
+    assert wait_for(first) == DONE
+    assert first.subscribers == {'a', 'b'}
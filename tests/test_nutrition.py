@@ -0,0 +1,15 @@
+import datetime
+
+import pytest
+
+from fitcoach import nutrition
+
+
+@pytest.mark.parametrize('diet', nutrition.DIETS)
+@pytest.mark.parametrize('calories, protein', [(2000, 100), (2300, 120), (2800, 160)])
+def test_day_uses_each_main_food_once(diet, calories, protein):
+    for week in range(3):
+        start = datetime.date(2026, 10, 12) + datetime.timedelta(weeks=week)
+        for day in nutrition.week_plan(start, diet, calories, protein):
+            mains = [meal.items[0].split(" (")[0].split("× ")[-1] for meal in day.meals]
+            assert len(set(mains)) == len(mains), (day.date, mains)
@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+
+from fitcoach import rollover
+
+PLANNED = [10] * 7
+
+
+def add_days(storage, first, count, weight):
+    day = datetime.date.fromisoformat(first)
+    for i in range(count):
+        storage.append_history('u', {'date': (day + datetime.timedelta(days=i)).isoformat(), 'weight': weight, 'tasks': 5})
+
+
+def rollup(storage, period, start):
+    return next(r for r in storage.load_rollups('u', period) if r['start'] == start)
+
+
+def test_refresh_keeps_week_crossing_month_boundary_whole(storage):
+    # Mon 2026-09-28 .. Sun 2026-10-04 spans September and October.
+    add_days(storage, '2026-09-28', 3, 70.0)
+    add_days(storage, '2026-10-01', 4, 80.0)
+    rollover.refresh_rollups(storage, 'u', PLANNED)
+    before = rollup(storage, 'week', '2026-09-28')
+    assert before['days'] == 7
+
+    storage.append_history('u', {'date': '2026-10-15', 'weight': 81.0, 'tasks': 5})
+    rollover.refresh_rollups(storage, 'u', PLANNED, since='2026-10-15')
+
+    assert rollup(storage, 'week', '2026-09-28') == before
+    assert rollup(storage, 'month', '2026-10-01')['days'] == 5
+    assert rollup(storage, 'month', '2026-09-01')['weight'] == pytest.approx(70.0)
+
+
+def test_refresh_leaves_previous_month_whole(storage):
+    add_days(storage, '2024-01-01', 31, 70.0)
+    add_days(storage, '2024-02-01', 29, 72.0)
+    rollover.refresh_rollups(storage, 'u', PLANNED)
+    january = rollup(storage, 'month', '2024-01-01')
+    assert january['days'] == 31
+
+    rollover.refresh_rollups(storage, 'u', PLANNED, since='2024-02-15')
+
+    assert rollup(storage, 'month', '2024-01-01') == january
+    assert rollup(storage, 'month', '2024-02-01')['days'] == 29
+
+
+def test_refresh_derives_missing_completion_from_tasks(storage):
+    add_days(storage, '2026-10-05', 7, 70.0)
+    rollover.refresh_rollups(storage, 'u', PLANNED)
+    assert rollup(storage, 'week', '2026-10-05')['completion'] == pytest.approx(0.5)
+
+
+def test_roll_over_user_compacts_finished_days_once(storage):
+    storage.save_profile('u', {'name': 'A'})
+    now = datetime.datetime(2026, 10, 17, 12, tzinfo=datetime.timezone.utc)
+    storage.increment_daily('u', '2026-10-15', 'protein', 90)
+    storage.set_task_done('u', '2026-10-15', 'squat', True)
+    storage.increment_daily('u', '2026-10-17', 'protein', 30)  # today: not compacted yet
+
+    assert rollover.roll_over_user(storage, 'u', now) == 1
+    assert rollover.roll_over_user(storage, 'u', now) == 0
+    [row] = storage.load_history('u')
+    assert (row['date'], row['protein'], row['tasks']) == ('2026-10-15', 90, 1)
+    assert storage.last_rollover('u') == '2026-10-16'
+
+
+def test_local_today_follows_profile_timezone():
+    now = datetime.datetime(2026, 10, 17, 20, tzinfo=datetime.timezone.utc)
+    assert rollover.local_today('Asia/Tokyo', now) == datetime.date(2026, 10, 18)
+    assert rollover.local_today('America/New_York', now) == datetime.date(2026, 10, 17)
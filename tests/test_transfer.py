@@ -0,0 +1,73 @@
+import datetime
+import io
+
+import pandas as pd
+import pytest
+
+from fitcoach import transfer
+from fitcoach.storage import open_storage
+
+TODAY = datetime.date(2026, 10, 17)
+
+
+def test_validate_maps_aliases_and_rejects_bad_rows():
+    frame = pd.DataFrame({
+        'Day': ['2026-10-01', '2026-10-02', 'not a date', '2030-01-01', '2026-10-03'],
+        'Weight (kg)': ['70.5', '900', '71', '71', None],
+        'Step Count': ['8000', '9000', '1', '1', '7000'],
+    })
+    rows, errors = transfer.validate(frame, 'history', TODAY)
+    assert list(rows['date']) == ['2026-10-01', '2026-10-03']
+    assert rows['weight'][0] == 70.5 and rows['weight'][1] is None
+    assert errors == ["Row 2: invalid weight", "Row 3: invalid date", "Row 4: invalid date"]
+
+
+def test_validate_reduces_timestamps_with_offsets_to_dates():
+    frame = pd.DataFrame({'timestamp': ['2026-10-15T10:00:00Z', '2026-10-14T08:00:00+05:30', '2026-10-13']})
+    rows, errors = transfer.validate(frame, 'history', TODAY)
+    assert list(rows['date']) == ['2026-10-15', '2026-10-14', '2026-10-13'] and not errors
+
+
+def test_validate_keeps_last_row_per_date():
+    frame = pd.DataFrame({'date': ['2026-10-01', '2026-10-01'], 'weight': [70, 71]})
+    rows, _ = transfer.validate(frame, 'history', TODAY)
+    assert list(rows['weight']) == [71]
+
+
+def test_import_of_weight_only_file_keeps_stored_tasks(storage):
+    storage.append_history('u', {'date': '2026-10-01', 'weight': 70.0, 'tasks': 12})
+    result = transfer.import_file(storage, 'u', io.StringIO("date,weight\n2026-10-01,69.5\n"), 'history', 'csv', today=TODAY)
+    assert result == {'imported': 1, 'rejected': 0, 'errors': [], 'days': ['2026-10-01']}
+    [row] = storage.load_history('u')
+    assert (row['weight'], row['tasks']) == (69.5, 12)
+
+
+@pytest.mark.parametrize('fmt', transfer.FORMATS)
+def test_export_then_import_round_trips(storage, tmp_path, fmt):
+    storage.append_history('u', {'date': '2026-10-01', 'weight': 70.0, 'tasks': 5})
+    storage.append_history('u', {
+        'date': '2026-10-02', 'weight': 70.5, 'tasks': 7, 'protein': 110, 'water': 2.5, 'steps': 9000,
+        'soreness': 3, 'completion': 0.7,
+    })
+    exported = transfer.export_file(storage, 'u', 'history', fmt, batch_size=1)
+    other = open_storage(f"sqlite:///{tmp_path / 'other.sqlite'}")
+    transfer.import_file(other, 'u', exported, 'history', fmt, today=TODAY)
+    assert other.load_history('u') == storage.load_history('u')
+
+
+def test_daily_import_marks_completed_tasks(storage):
+    data = "date,protein,tasks_done\n2026-10-01,90,squat plank\n"
+    transfer.import_file(storage, 'u', io.StringIO(data), 'daily', 'csv', today=TODAY)
+    log = storage.load_daily_log('u', '2026-10-01')
+    assert log['protein'] == 90 and log['completed_tasks'] == {'squat', 'plank'}
+
+
+def test_partial_daily_import_keeps_stored_values(storage):
+    storage.increment_daily('u', '2026-10-01', 'protein', 120)
+    storage.increment_daily('u', '2026-10-01', 'water', 3.0)
+    transfer.import_file(storage, 'u', io.StringIO("date,steps\n2026-10-01,8000\n2026-10-02,5000\n"), 'daily', 'csv',
+                         today=TODAY)
+    assert storage.load_daily_log('u', '2026-10-01') == {
+        'protein': 120, 'water': 3.0, 'steps': 8000, 'soreness': 0, 'completed_tasks': set(),
+    }
+    assert storage.load_daily_log('u', '2026-10-02')['protein'] == 0